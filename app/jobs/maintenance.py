@@ -0,0 +1,108 @@
+"""Periodic housekeeping: purge long-expired files and, on SQLite, reclaim space.
+
+Usage:
+    python -m app.jobs.maintenance
+
+Expired rows are kept for ``EXPIRED_RETENTION_SECONDS`` so their links keep
+answering ``410`` for a while, then deleted, together with finished async
+upload jobs older than the same window. On the embedded SQLite profile
+each pass also runs ``PRAGMA incremental_vacuum`` when rows were deleted and
+checkpoints the WAL so it does not grow without bound. The API process runs
+this loop every ``MAINTENANCE_INTERVAL_SECONDS`` (default 300 on SQLite, off
+otherwise).
+"""
+import asyncio
+import logging
+import os
+from dataclasses import dataclass
+from datetime import datetime, timedelta, timezone
+
+from sqlalchemy import Engine
+from sqlalchemy.orm import sessionmaker
+
+from app.database import DATABASE_URL, SessionLocal, engine, is_sqlite_file
+from app.services.encrypted_file_service import EncryptedFileService
+from app.services.upload_job_service import UploadJobService
+
+logger = logging.getLogger(__name__)
+
+EXPIRED_RETENTION_SECONDS = float(os.getenv("EXPIRED_RETENTION_SECONDS", str(7 * 24 * 3600)))
+MAINTENANCE_INTERVAL_SECONDS = float(
+    os.getenv("MAINTENANCE_INTERVAL_SECONDS", "300" if is_sqlite_file(DATABASE_URL) else "0")
+)
+
+
+@dataclass
+class MaintenanceStats:
+    purged: int = 0
+    vacuumed_pages: int = 0
+    checkpointed_frames: int = 0
+
+
+def sqlite_incremental_vacuum(writer: Engine) -> int:
+    """Return freed pages to the filesystem; returns how many were on the freelist."""
+    # Raw connections bypass the writer's BEGIN IMMEDIATE hook and run in autocommit.
+    conn = writer.raw_connection()
+    try:
+        free_pages = conn.execute("PRAGMA freelist_count").fetchone()[0]
+        if free_pages:
+            # executescript steps the pragma to completion; a cursor stops after one page.
+            conn.executescript("PRAGMA incremental_vacuum;")
+    finally:
+        conn.close()
+    return free_pages
+
+
+def sqlite_checkpoint(writer: Engine) -> int:
+    """Copy the WAL back into the database file and truncate it; returns frames checkpointed."""
+    conn = writer.raw_connection()
+    try:
+        busy, log_frames, checkpointed = conn.execute("PRAGMA wal_checkpoint(TRUNCATE)").fetchone()
+    finally:
+        conn.close()
+    return checkpointed
+
+
+def run_maintenance(
+    session_factory: sessionmaker,
+    writer: Engine | None = None,
+    *,
+    retention: float = EXPIRED_RETENTION_SECONDS,
+) -> MaintenanceStats:
+    stats = MaintenanceStats()
+    cutoff = datetime.now(timezone.utc) - timedelta(seconds=retention)
+    with session_factory() as session:
+        stats.purged = EncryptedFileService(session).purge_expired(cutoff)
+        stats.purged += UploadJobService(session).purge_finished(cutoff)
+    if writer is not None:
+        if stats.purged:
+            stats.vacuumed_pages = sqlite_incremental_vacuum(writer)
+        stats.checkpointed_frames = sqlite_checkpoint(writer)
+    logger.info(
+        "maintenance: purged=%d vacuumed_pages=%d checkpointed_frames=%d",
+        stats.purged, stats.vacuumed_pages, stats.checkpointed_frames,
+    )
+    return stats
+
+
+async def maintain_periodically(session_factory: sessionmaker, writer: Engine | None, interval: float) -> None:
+    while True:
+        await asyncio.sleep(interval)
+        try:
+            await asyncio.to_thread(run_maintenance, session_factory, writer)
+        except Exception:
+            logger.exception("maintenance pass failed")
+
+
+def main() -> None:
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(message)s")
+    writer = engine if is_sqlite_file(DATABASE_URL) else None
+    stats = run_maintenance(SessionLocal, writer)
+    print(
+        f"done: purged={stats.purged} vacuumed_pages={stats.vacuumed_pages} "
+        f"checkpointed_frames={stats.checkpointed_frames}"
+    )
+
+
+if __name__ == "__main__":
+    main()
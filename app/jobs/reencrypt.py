@@ -0,0 +1,322 @@
+"""Re-encrypt and/or relocate existing encrypted_files rows.
+
+Usage:
+    python -m app.jobs.reencrypt --workers 4 --batch-size 200 \\
+        --target-storage fs --checkpoint reencrypt.checkpoint.json
+
+Rows are streamed in keyset-paginated batches (``id > last_id``), transformed
+in a process pool and written back with one commit per batch. After each commit
+the last processed id is written to the checkpoint file together with the
+options of the run, so a crashed run picks up where it stopped; the file is
+removed once a run completes, and a checkpoint left by a run with different
+options is discarded rather than resumed. Rows whose key would have to be
+re-derived from the recipient's public key (changed KDF parameters, or a stored
+key that no longer opens the ciphertext) are flagged with ``needs_migration``
+and rewritten on their next download instead. Each row is written back only if
+its key material and content are unchanged since the batch was read; rows
+rewritten meanwhile by a download are skipped and counted.
+"""
+import argparse
+import json
+import logging
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass, asdict
+from functools import partial
+
+from sqlalchemy import and_, or_, select, update
+from sqlalchemy.orm import Session, sessionmaker
+
+from app.database import SessionLocal
+from app.models.encrypted_file import EncryptedFile, STORAGE_DB, STORAGE_FS
+from app.services.blob_store import LocalBlobStore, BLOB_STORE_DIR
+from app.services.encrypted_file_service import EncryptedFileService
+from app.services.encryptor import Encryptor, KDF_ITERATIONS, CURRENT_FORMAT_VERSION
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class MigrationOptions:
+    target_format: int = CURRENT_FORMAT_VERSION
+    target_storage: str = STORAGE_DB
+    blob_dir: str = BLOB_STORE_DIR
+
+
+@dataclass
+class MigrationStats:
+    last_id: int = 0
+    processed: int = 0
+    rewritten: int = 0
+    flagged: int = 0
+    skipped: int = 0
+    errors: int = 0
+    elapsed: float = 0.0
+
+    @property
+    def rows_per_second(self) -> float:
+        return self.processed / self.elapsed if self.elapsed else 0.0
+
+
+def transform_row(row: dict, options: MigrationOptions) -> dict:
+    """Compute the new column values for one row.
+
+    Runs inside a worker process, so it only sees plain data and the blob store
+    directory; the parent process owns the database session.
+    """
+    result = {"id": row["id"], "values": {}, "flag": False, "error": None, "new_blob": None, "drop_blob": None}
+    store = LocalBlobStore(options.blob_dir)
+    try:
+        if row["storage"] == STORAGE_FS:
+            content = store.get(row["blob_key"])
+        else:
+            content = row["content"]
+
+        # Envelope rows store a wrapped data key, so neither KDF nor format can change here.
+        if not row["is_envelope"]:
+            # Lazy migration re-derives with KDF_ITERATIONS, so that is the only target.
+            if row["kdf_iterations"] != KDF_ITERATIONS:
+                result["flag"] = True
+
+            # target_format is a minimum: newer formats (e.g. AES-GCM text rows) are never downgraded.
+            if row["format_version"] < options.target_format and not (row["needs_migration"] or result["flag"]):
+                try:
+                    encryptor = Encryptor.from_key(row["key"], row["salt"], row["kdf_iterations"])
+                    plaintext = encryptor.decrypt(content, row["format_version"])
+                    content = encryptor.encrypt(plaintext, options.target_format)
+                except Exception:
+                    # The stored key cannot open this row; only the recipient can.
+                    result["flag"] = True
+                else:
+                    result["values"]["format_version"] = options.target_format
+                    result["values"]["content_sha256"] = EncryptedFileService.content_digest(content)
+
+        rewritten = "format_version" in result["values"]
+        if options.target_storage == STORAGE_FS:
+            if row["storage"] != STORAGE_FS or rewritten:
+                # The committed row keeps pointing at the old blob until the batch commit switches blob_key.
+                result["new_blob"] = store.new_key(row["download_token"])
+                store.put(result["new_blob"], content)
+                result["values"].update(blob_key=result["new_blob"], content=b"")
+        elif row["storage"] != STORAGE_DB or rewritten:
+            result["values"].update(blob_key=None, content=content)
+        if row["storage"] == STORAGE_FS and "blob_key" in result["values"]:
+            result["drop_blob"] = row["blob_key"]
+        if row["storage"] != options.target_storage:
+            result["values"]["storage"] = options.target_storage
+    except Exception as exc:
+        result["error"] = f"{type(exc).__name__}: {exc}"
+    return result
+
+
+def _candidates(options: MigrationOptions):
+    return or_(
+        EncryptedFile.storage != options.target_storage,
+        and_(
+            EncryptedFile.needs_migration.is_(False),
+            EncryptedFile.is_envelope.is_(False),
+            or_(
+                EncryptedFile.format_version < options.target_format,
+                EncryptedFile.kdf_iterations != KDF_ITERATIONS,
+            ),
+        ),
+    )
+
+
+def _write_row(session: Session, row: dict, values: dict) -> bool:
+    """Apply ``values`` only if the row still holds the key material and content that were read."""
+    result = session.execute(
+        update(EncryptedFile)
+        .where(
+            EncryptedFile.id == row["id"],
+            EncryptedFile.salt == row["salt"],
+            EncryptedFile.kdf_iterations == row["kdf_iterations"],
+            EncryptedFile.content_sha256.is_not_distinct_from(row["content_sha256"]),
+            EncryptedFile.blob_key.is_not_distinct_from(row["blob_key"]),
+            EncryptedFile.storage == row["storage"],
+        )
+        .values(**values)
+        .execution_options(synchronize_session=False)
+    )
+    return result.rowcount == 1
+
+
+def _fetch_batch(session: Session, last_id: int, batch_size: int, options: MigrationOptions) -> list[dict]:
+    stmt = (
+        select(
+            EncryptedFile.id,
+            EncryptedFile.download_token,
+            EncryptedFile.content,
+            EncryptedFile.salt,
+            EncryptedFile.key,
+            EncryptedFile.kdf_iterations,
+            EncryptedFile.format_version,
+            EncryptedFile.storage,
+            EncryptedFile.blob_key,
+            EncryptedFile.content_sha256,
+            EncryptedFile.needs_migration,
+            EncryptedFile.is_envelope,
+        )
+        .where(EncryptedFile.id > last_id, _candidates(options))
+        .order_by(EncryptedFile.id)
+        .limit(batch_size)
+    )
+    return [dict(r._mapping) for r in session.execute(stmt)]
+
+
+def load_checkpoint(path: str | None, options: MigrationOptions) -> MigrationStats:
+    if path and os.path.exists(path):
+        with open(path) as fh:
+            saved = json.load(fh)
+        if saved.get("options") == asdict(options):
+            return MigrationStats(**saved["stats"])
+        # Skipping ids already visited under other options would leave rows unmigrated.
+        logger.warning("checkpoint %s was written for different options; starting over", path)
+    return MigrationStats()
+
+
+def save_checkpoint(path: str | None, options: MigrationOptions, stats: MigrationStats) -> None:
+    if not path:
+        return
+    tmp = f"{path}.tmp"
+    with open(tmp, "w") as fh:
+        json.dump({"options": asdict(options), "stats": asdict(stats)}, fh)
+    os.replace(tmp, path)
+
+
+def clear_checkpoint(path: str | None) -> None:
+    if path and os.path.exists(path):
+        os.remove(path)
+
+
+def run_migration(
+    session_factory: sessionmaker,
+    options: MigrationOptions,
+    *,
+    batch_size: int = 200,
+    workers: int = os.cpu_count() or 1,
+    max_rows_per_second: float | None = None,
+    checkpoint: str | None = None,
+) -> MigrationStats:
+    stats = load_checkpoint(checkpoint, options)
+    store = LocalBlobStore(options.blob_dir)
+    executor = ProcessPoolExecutor(max_workers=workers) if workers > 0 else None
+    mapper = executor.map if executor else map
+    started = time.monotonic() - stats.elapsed
+    try:
+        while True:
+            batch_started = time.monotonic()
+            with session_factory() as session:
+                rows = _fetch_batch(session, stats.last_id, batch_size, options)
+                if not rows:
+                    break
+
+                results = list(mapper(partial(transform_row, options=options), rows))
+                read = {row["id"]: row for row in rows}
+                created = []
+                dropped = []
+                try:
+                    for res in results:
+                        if res["error"]:
+                            stats.errors += 1
+                            logger.warning("row %s: %s", res["id"], res["error"])
+                            continue
+                        values = dict(res["values"])
+                        if res["flag"]:
+                            values["needs_migration"] = True
+                        if not values:
+                            continue
+                        if res["new_blob"]:
+                            created.append(res["new_blob"])
+                        if not _write_row(session, read[res["id"]], values):
+                            # Rewritten by a download (lazy migration) since the batch was read.
+                            stats.skipped += 1
+                            logger.info("row %s changed during the batch; skipped", res["id"])
+                            if res["new_blob"]:
+                                store.delete(res["new_blob"])
+                                created.remove(res["new_blob"])
+                            continue
+                        if res["flag"]:
+                            stats.flagged += 1
+                        if res["values"]:
+                            stats.rewritten += 1
+                        if res["drop_blob"]:
+                            dropped.append(res["drop_blob"])
+                    session.commit()
+                except Exception:
+                    session.rollback()
+                    for blob_key in created:
+                        store.delete(blob_key)
+                    raise
+
+            # Old blobs are only removed once no committed row points at them.
+            for blob_key in dropped:
+                store.delete(blob_key)
+
+            stats.last_id = rows[-1]["id"]
+            stats.processed += len(rows)
+            stats.elapsed = time.monotonic() - started
+            save_checkpoint(checkpoint, options, stats)
+            logger.info(
+                "processed=%d rewritten=%d flagged=%d skipped=%d errors=%d (%.1f rows/s)",
+                stats.processed, stats.rewritten, stats.flagged, stats.skipped, stats.errors,
+                stats.rows_per_second,
+            )
+
+            if max_rows_per_second:
+                min_duration = len(rows) / max_rows_per_second
+                spent = time.monotonic() - batch_started
+                if spent < min_duration:
+                    time.sleep(min_duration - spent)
+    finally:
+        if executor:
+            executor.shutdown()
+    # A finished run must not make the next one skip every row.
+    clear_checkpoint(checkpoint)
+    stats.elapsed = time.monotonic() - started
+    return stats
+
+
+def main(argv: list[str] | None = None) -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--target-format", type=int, default=CURRENT_FORMAT_VERSION,
+                        help="minimum format; rows already in a newer format are left as they are")
+    parser.add_argument("--target-storage", choices=[STORAGE_DB, STORAGE_FS], default=STORAGE_DB)
+    parser.add_argument("--blob-dir", default=BLOB_STORE_DIR)
+    parser.add_argument("--batch-size", type=int, default=200)
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1,
+                        help="process pool size; 0 runs transforms in-process")
+    parser.add_argument("--max-rows-per-second", type=float, default=None,
+                        help="throttle to protect live traffic")
+    parser.add_argument("--checkpoint", default="reencrypt.checkpoint.json",
+                        help="progress file used to resume after a crash")
+    parser.add_argument("--restart", action="store_true", help="ignore an existing checkpoint")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(message)s")
+    if args.restart:
+        clear_checkpoint(args.checkpoint)
+
+    options = MigrationOptions(
+        target_format=args.target_format,
+        target_storage=args.target_storage,
+        blob_dir=args.blob_dir,
+    )
+    stats = run_migration(
+        SessionLocal,
+        options,
+        batch_size=args.batch_size,
+        workers=args.workers,
+        max_rows_per_second=args.max_rows_per_second,
+        checkpoint=args.checkpoint,
+    )
+    print(
+        f"done: processed={stats.processed} rewritten={stats.rewritten} flagged={stats.flagged} "
+        f"skipped={stats.skipped} errors={stats.errors} "
+        f"elapsed={stats.elapsed:.1f}s ({stats.rows_per_second:.1f} rows/s)"
+    )
+
+
+if __name__ == "__main__":
+    main()
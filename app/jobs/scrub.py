@@ -0,0 +1,202 @@
+"""Verify stored ciphertext against its recorded SHA-256 checksum.
+
+Usage:
+    python -m app.jobs.scrub --workers 8 --max-bytes-per-second 20000000
+
+Row ids and sizes are listed in keyset-paginated batches and each row's content
+is fetched and hashed in a thread pool, with all reads sharing one byte-rate
+limit so the scrub does not starve live traffic.
+Mismatching rows (including blobs missing from the blob store) are reported and
+quarantined: downloads and acks for them answer ``409`` until an operator
+restores the content and clears ``quarantined_at``. Set
+``SCRUB_INTERVAL_SECONDS`` to also run the scrubber in the background of the
+API process.
+"""
+import argparse
+import asyncio
+import logging
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from datetime import datetime, timezone
+from functools import partial
+
+from sqlalchemy import func, select, update
+from sqlalchemy.orm import sessionmaker
+
+from app.database import SessionLocal
+from app.models.encrypted_file import EncryptedFile, STORAGE_FS
+from app.services.blob_store import LocalBlobStore, BLOB_STORE_DIR
+from app.services.encrypted_file_service import EncryptedFileService
+
+logger = logging.getLogger(__name__)
+
+SCRUB_INTERVAL_SECONDS = float(os.getenv("SCRUB_INTERVAL_SECONDS", "0"))
+SCRUB_MAX_BYTES_PER_SECOND = float(os.getenv("SCRUB_MAX_BYTES_PER_SECOND", "0"))
+
+
+class RateLimiter:
+    """Spaces out reads so that at most ``rate`` bytes per second are consumed."""
+
+    def __init__(self, rate: float | None):
+        self.rate = rate
+        self._lock = threading.Lock()
+        self._next_free = time.monotonic()
+
+    def acquire(self, amount: int) -> None:
+        if not self.rate:
+            return
+        with self._lock:
+            now = time.monotonic()
+            start = max(now, self._next_free)
+            self._next_free = start + amount / self.rate
+        if start > now:
+            time.sleep(start - now)
+
+
+@dataclass
+class ScrubStats:
+    checked: int = 0
+    bytes_read: int = 0
+    mismatched: list[int] = field(default_factory=list)
+    elapsed: float = 0.0
+
+
+def verify_row(
+    row: dict, store: LocalBlobStore, limiter: RateLimiter, session_factory: sessionmaker
+) -> tuple[int, int, bool]:
+    """Return ``(id, bytes_read, ok)`` for one row."""
+    if row["storage"] == STORAGE_FS:
+        path = store.path_for(row["blob_key"])
+        try:
+            limiter.acquire(path.stat().st_size)
+            content = store.get(row["blob_key"])
+        except OSError:
+            return row["id"], 0, False
+    else:
+        # Database content is only fetched once the limiter lets this row through.
+        limiter.acquire(row["content_length"] or 0)
+        with session_factory() as session:
+            content = session.scalar(select(EncryptedFile.content).where(EncryptedFile.id == row["id"]))
+        if content is None:  # purged since the batch was listed
+            return row["id"], 0, True
+    return row["id"], len(content), EncryptedFileService.content_digest(content) == row["content_sha256"]
+
+
+def run_scrub(
+    session_factory: sessionmaker,
+    *,
+    blob_dir: str = BLOB_STORE_DIR,
+    batch_size: int = 200,
+    workers: int = 4,
+    max_bytes_per_second: float | None = None,
+    quarantine: bool = True,
+) -> ScrubStats:
+    stats = ScrubStats()
+    store = LocalBlobStore(blob_dir)
+    limiter = RateLimiter(max_bytes_per_second)
+    started = time.monotonic()
+    last_id = 0
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        while True:
+            with session_factory() as session:
+                stmt = (
+                    select(
+                        EncryptedFile.id,
+                        EncryptedFile.storage,
+                        EncryptedFile.blob_key,
+                        func.length(EncryptedFile.content).label("content_length"),
+                        EncryptedFile.content_sha256,
+                    )
+                    .where(
+                        EncryptedFile.id > last_id,
+                        EncryptedFile.content_sha256.is_not(None),
+                        EncryptedFile.quarantined_at.is_(None),
+                    )
+                    .order_by(EncryptedFile.id)
+                    .limit(batch_size)
+                )
+                rows = [dict(r._mapping) for r in session.execute(stmt)]
+                if not rows:
+                    break
+
+                bad = []
+                results = executor.map(partial(verify_row, store=store, limiter=limiter, session_factory=session_factory), rows)
+                for row, (row_id, nbytes, ok) in zip(rows, results):
+                    stats.checked += 1
+                    stats.bytes_read += nbytes
+                    if not ok:
+                        bad.append(row)
+
+                for row in bad:
+                    if quarantine:
+                        # Only quarantine the version we hashed; a concurrent rewrite switches
+                        # blob_key and content_sha256 in one commit and must not be flagged.
+                        changed = session.execute(
+                            update(EncryptedFile)
+                            .where(
+                                EncryptedFile.id == row["id"],
+                                EncryptedFile.content_sha256 == row["content_sha256"],
+                                EncryptedFile.blob_key.is_not_distinct_from(row["blob_key"]),
+                            )
+                            .values(quarantined_at=datetime.now(timezone.utc))
+                            .execution_options(synchronize_session=False)
+                        ).rowcount
+                        if not changed:
+                            logger.info("encrypted_files.id=%s was rewritten while scrubbing; skipped", row["id"])
+                            continue
+                    logger.error("checksum mismatch for encrypted_files.id=%s", row["id"])
+                    stats.mismatched.append(row["id"])
+                session.commit()
+            last_id = rows[-1]["id"]
+
+    stats.elapsed = time.monotonic() - started
+    logger.info(
+        "scrubbed %d rows (%d bytes) in %.1fs, %d mismatched",
+        stats.checked, stats.bytes_read, stats.elapsed, len(stats.mismatched),
+    )
+    return stats
+
+
+async def scrub_periodically(session_factory: sessionmaker, interval: float, **kwargs) -> None:
+    """Background loop used by the API process when ``SCRUB_INTERVAL_SECONDS`` is set."""
+    while True:
+        try:
+            await asyncio.to_thread(run_scrub, session_factory, **kwargs)
+        except Exception:
+            logger.exception("background scrub failed")
+        await asyncio.sleep(interval)
+
+
+def main(argv: list[str] | None = None) -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--blob-dir", default=BLOB_STORE_DIR)
+    parser.add_argument("--batch-size", type=int, default=200)
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--max-bytes-per-second", type=float, default=SCRUB_MAX_BYTES_PER_SECOND or None,
+                        help="I/O rate limit shared by all workers")
+    parser.add_argument("--report-only", action="store_true", help="do not quarantine mismatches")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(message)s")
+    stats = run_scrub(
+        SessionLocal,
+        blob_dir=args.blob_dir,
+        batch_size=args.batch_size,
+        workers=args.workers,
+        max_bytes_per_second=args.max_bytes_per_second,
+        quarantine=not args.report_only,
+    )
+    print(
+        f"done: checked={stats.checked} bytes={stats.bytes_read} mismatched={len(stats.mismatched)} "
+        f"elapsed={stats.elapsed:.1f}s"
+    )
+    for row_id in stats.mismatched:
+        print(f"mismatch: encrypted_files.id={row_id}")
+    raise SystemExit(1 if stats.mismatched else 0)
+
+
+if __name__ == "__main__":
+    main()
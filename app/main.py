@@ -1,9 +1,47 @@
+import asyncio
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
-from app.database import Base, engine
+from app.database import Base, engine, SessionLocal, DATABASE_URL, is_sqlite_file
+from app.jobs.maintenance import maintain_periodically, MAINTENANCE_INTERVAL_SECONDS
+from app.jobs.scrub import scrub_periodically, SCRUB_INTERVAL_SECONDS, SCRUB_MAX_BYTES_PER_SECOND
 from app.routers.encrypted_files import router as files_router
+from app.routers.shared_files import router as shared_files_router
+from app.services.upload_job_service import UploadPipeline, UPLOAD_WORKERS
 from fastapi.middleware.cors import CORSMiddleware
 
-app = FastAPI()
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    tasks = []
+    if SCRUB_INTERVAL_SECONDS > 0:
+        tasks.append(asyncio.create_task(
+            scrub_periodically(
+                SessionLocal,
+                SCRUB_INTERVAL_SECONDS,
+                max_bytes_per_second=SCRUB_MAX_BYTES_PER_SECOND or None,
+            )
+        ))
+    if MAINTENANCE_INTERVAL_SECONDS > 0:
+        tasks.append(asyncio.create_task(
+            maintain_periodically(
+                SessionLocal,
+                engine if is_sqlite_file(DATABASE_URL) else None,
+                MAINTENANCE_INTERVAL_SECONDS,
+            )
+        ))
+    pipeline = None
+    if UPLOAD_WORKERS > 0:
+        pipeline = UploadPipeline(SessionLocal, UPLOAD_WORKERS)
+        await asyncio.to_thread(pipeline.start)
+        app.state.upload_pipeline = pipeline
+    yield
+    for task in tasks:
+        task.cancel()
+    if pipeline is not None:
+        pipeline.shutdown()
+
+
+app = FastAPI(lifespan=lifespan)
 app.add_middleware(
     CORSMiddleware,
     allow_origins=["http://localhost:5173", "http://localhost:8080"],
@@ -12,6 +50,7 @@ app.add_middleware(
     allow_headers=["*"],
 )
 app.include_router(files_router)
+app.include_router(shared_files_router)
 
 @app.get("/")
 def read_root():
@@ -1,6 +1,10 @@
 from datetime import datetime, timezone
-from sqlalchemy import Column, Integer, String, LargeBinary, DateTime
+from sqlalchemy import Column, Integer, String, LargeBinary, DateTime, Boolean
 from app.database import Base
+from app.services.encryptor import KDF_ITERATIONS, CURRENT_FORMAT_VERSION
+
+STORAGE_DB = "db"
+STORAGE_FS = "fs"
 
 
 class EncryptedFile(Base):
@@ -9,6 +13,7 @@ class EncryptedFile(Base):
     id = Column(Integer, primary_key=True, index=True)
     download_token = Column(String(64), unique=True, index=True, nullable=False)
     name = Column(String(255), nullable=False)
+    # Empty when the ciphertext lives in the blob store (storage == "fs").
     content = Column(LargeBinary, nullable=False)
     salt = Column(LargeBinary, nullable=False)
     key = Column(LargeBinary, nullable=False)
@@ -20,5 +25,18 @@ class EncryptedFile(Base):
         nullable=False,
     )
     download_count = Column(Integer, default=0, nullable=False)
-
-
+    format_version = Column(Integer, default=CURRENT_FORMAT_VERSION, nullable=False)
+    kdf_iterations = Column(Integer, default=KDF_ITERATIONS, nullable=False)
+    storage = Column(String(16), default=STORAGE_DB, nullable=False)
+    # Name of the ciphertext in the blob store when storage == "fs". Rewrites go
+    # to a new name that is switched in the same commit as the row's metadata.
+    blob_key = Column(String(96), nullable=True)
+    # Set by the re-encryption job for rows it cannot rewrite without the
+    # recipient's public key; cleared on the next successful download.
+    needs_migration = Column(Boolean, default=False, nullable=False)
+    # SHA-256 of the stored ciphertext, checked by the integrity scrubber.
+    content_sha256 = Column(String(64), nullable=True)
+    quarantined_at = Column(DateTime(timezone=True), nullable=True)
+    # Envelope rows hold content encrypted with a random data key; ``key`` is
+    # that data key wrapped for the owner and recipients live in recipient_keys.
+    is_envelope = Column(Boolean, default=False, nullable=False)
@@ -0,0 +1,25 @@
+from datetime import datetime, timezone
+from sqlalchemy import Column, Integer, String, LargeBinary, DateTime, ForeignKey
+from app.database import Base
+from app.services.encryptor import KDF_ITERATIONS
+
+
+class RecipientKey(Base):
+    """The data key of a shared (envelope) file, wrapped for one recipient."""
+
+    __tablename__ = "recipient_keys"
+
+    id = Column(Integer, primary_key=True, index=True)
+    file_id = Column(Integer, ForeignKey("encrypted_files.id", ondelete="CASCADE"), index=True, nullable=False)
+    download_token = Column(String(64), unique=True, index=True, nullable=False)
+    salt = Column(LargeBinary, nullable=False)
+    wrapped_key = Column(LargeBinary, nullable=False)
+    kdf_iterations = Column(Integer, default=KDF_ITERATIONS, nullable=False)
+    max_downloads = Column(Integer, nullable=False)
+    expiration_date = Column(DateTime(timezone=True), nullable=False)
+    created_at = Column(
+        DateTime(timezone=True),
+        default=lambda: datetime.now(timezone.utc),
+        nullable=False,
+    )
+    download_count = Column(Integer, default=0, nullable=False)
@@ -0,0 +1,33 @@
+from datetime import datetime, timezone
+from sqlalchemy import Column, Integer, String, DateTime
+from app.database import Base
+
+JOB_PENDING = "pending"
+JOB_PROCESSING = "processing"
+JOB_READY = "ready"
+JOB_FAILED = "failed"
+
+
+class UploadJob(Base):
+    """An accepted upload whose body is spooled on local disk awaiting encryption."""
+
+    __tablename__ = "upload_jobs"
+
+    id = Column(Integer, primary_key=True, index=True)
+    # Handed to the client up front; becomes the EncryptedFile token once ready.
+    download_token = Column(String(64), unique=True, index=True, nullable=False)
+    status = Column(String(16), default=JOB_PENDING, index=True, nullable=False)
+    name = Column(String(255), nullable=False)
+    spool_path = Column(String(1024), nullable=False)
+    # Needed by the worker for key derivation; cleared as soon as the job finishes.
+    public_key = Column(String, nullable=True)
+    max_downloads = Column(Integer, nullable=False)
+    expiration_date = Column(DateTime(timezone=True), nullable=False)
+    error = Column(String(255), nullable=True)
+    created_at = Column(
+        DateTime(timezone=True),
+        default=lambda: datetime.now(timezone.utc),
+        nullable=False,
+    )
+    started_at = Column(DateTime(timezone=True), nullable=True)
+    finished_at = Column(DateTime(timezone=True), nullable=True)
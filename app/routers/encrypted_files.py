@@ -1,13 +1,20 @@
-from fastapi import APIRouter, UploadFile, File, Form, Depends, HTTPException
+from fastapi import APIRouter, UploadFile, File, Form, Depends, HTTPException, Request
+from starlette.concurrency import run_in_threadpool
 from fastapi.responses import StreamingResponse
 from io import BytesIO
-from app.services.encryptor import Encryptor
+from pydantic import BaseModel
+from app.services.encryptor import Encryptor, FORMAT_AESGCM
 from app.services.encrypted_file_service import EncryptedFileService
 from app.models.encrypted_file import EncryptedFile
+from app.models.upload_job import UploadJob, JOB_PENDING, JOB_PROCESSING, JOB_READY, JOB_FAILED
+from app.services.upload_job_service import UploadJobService
 from app.database import get_db
 from sqlalchemy.orm import Session
 from datetime import datetime, timezone
+import asyncio
 import hashlib
+import os
+import time
 import base64
 import json
 from cryptography.hazmat.primitives.kdf.pbkdf2 import PBKDF2HMAC
@@ -16,20 +23,21 @@ from cryptography.hazmat.primitives.ciphers.aead import AESGCM
 
 router = APIRouter()
 
-@router.post("/files/upload")
-async def upload_file(
-    file: UploadFile | None = File(default=None),
-    text: str | None = Form(default=None),
-    public_key: str = Form(...),
-    max_downloads: int | None = Form(default=None),
-    expiration_date: datetime | None = Form(default=None),
-    policy_b64: str | None = Form(default=None),
-    db: Session = Depends(get_db),
-):
-    provided = [(file is not None), (text is not None and text != "")]
-    if sum(provided) != 1:
-        raise HTTPException(status_code=400, detail="Provide exactly one of 'file' or 'text'")
+# Largest UTF-8 payload accepted by the JSON text endpoints.
+TEXT_MAX_BYTES = int(os.getenv("TEXT_MAX_BYTES", "16384"))
+# Upper bound for the long-poll ``wait`` parameter of the upload status endpoint.
+UPLOAD_STATUS_MAX_WAIT = float(os.getenv("UPLOAD_STATUS_MAX_WAIT", "30"))
+
+
+class TextUpload(BaseModel):
+    text: str
+    public_key: str
+    max_downloads: int | None = None
+    expiration_date: datetime | None = None
+    policy_b64: str | None = None
 
+
+def _apply_policy(policy_b64, public_key, max_downloads, expiration_date):
     # Decrypt policy if provided (policy_b64 packs: salt(16) | iv(12) | ciphertext)
     if policy_b64 is not None:
         try:
@@ -57,6 +65,68 @@ async def upload_file(
 
     if max_downloads is None or expiration_date is None:
         raise HTTPException(status_code=400, detail="Missing policy: max_downloads/expiration_date")
+    return max_downloads, expiration_date
+
+
+def _get_downloadable(db: Session, token: str) -> EncryptedFile:
+    # Shared (envelope) files are only reachable through recipient tokens.
+    rec: EncryptedFile | None = (
+        db.query(EncryptedFile).filter_by(download_token=token, is_envelope=False).first()
+    )
+    if not rec:
+        job: UploadJob | None = db.query(UploadJob).filter_by(download_token=token).first()
+        if job and job.status in (JOB_PENDING, JOB_PROCESSING):
+            raise HTTPException(status_code=202, detail="File is still processing", headers={"Retry-After": "1"})
+        raise HTTPException(status_code=404, detail="File not found")
+
+    now_utc = datetime.now(timezone.utc)
+    rec_expiration = rec.expiration_date
+    if rec_expiration.tzinfo is None:
+        rec_expiration = rec_expiration.replace(tzinfo=timezone.utc)
+    else:
+        rec_expiration = rec_expiration.astimezone(timezone.utc)
+    if rec_expiration <= now_utc:
+        raise HTTPException(status_code=410, detail="Link expired")
+
+    if rec.download_count >= rec.max_downloads:
+        raise HTTPException(status_code=429, detail="Download limit reached")
+
+    if rec.quarantined_at is not None:
+        raise HTTPException(status_code=409, detail="File failed integrity check")
+    return rec
+
+
+def _decrypt_record(db: Session, rec: EncryptedFile, public_key: str) -> bytes:
+    service = EncryptedFileService(db)
+    content = service.load_verified(rec)
+    if content is None:
+        raise HTTPException(status_code=409, detail="File failed integrity check")
+
+    encryptor = Encryptor(public_key, salt=rec.salt, iterations=rec.kdf_iterations)
+    try:
+        plaintext = encryptor.decrypt(content, rec.format_version)
+    except Exception:
+        raise HTTPException(status_code=400, detail="Invalid public key or corrupted file")
+
+    if rec.needs_migration:
+        service.migrate_on_download(rec, public_key, plaintext)
+    return plaintext
+
+@router.post("/files/upload")
+async def upload_file(
+    file: UploadFile | None = File(default=None),
+    text: str | None = Form(default=None),
+    public_key: str = Form(...),
+    max_downloads: int | None = Form(default=None),
+    expiration_date: datetime | None = Form(default=None),
+    policy_b64: str | None = Form(default=None),
+    db: Session = Depends(get_db),
+):
+    provided = [(file is not None), (text is not None and text != "")]
+    if sum(provided) != 1:
+        raise HTTPException(status_code=400, detail="Provide exactly one of 'file' or 'text'")
+
+    max_downloads, expiration_date = _apply_policy(policy_b64, public_key, max_downloads, expiration_date)
 
     encryptor = Encryptor(public_key)
 
@@ -84,33 +154,130 @@ async def upload_file(
         "download_token": record.download_token,
     }
 
-@router.get("/files/download/{token}")
-def download_file_by_token(
-    token: str,
-    public_key: str,
+
+@router.post("/files/upload/async", status_code=202)
+async def upload_file_async(
+    request: Request,
+    file: UploadFile | None = File(default=None),
+    text: str | None = Form(default=None),
+    public_key: str = Form(...),
+    max_downloads: int | None = Form(default=None),
+    expiration_date: datetime | None = Form(default=None),
+    policy_b64: str | None = Form(default=None),
     db: Session = Depends(get_db),
 ):
-    rec: EncryptedFile | None = db.query(EncryptedFile).filter_by(download_token=token).first()
-    if not rec:
-        raise HTTPException(status_code=404, detail="File not found")
+    provided = [(file is not None), (text is not None and text != "")]
+    if sum(provided) != 1:
+        raise HTTPException(status_code=400, detail="Provide exactly one of 'file' or 'text'")
 
-    now_utc = datetime.now(timezone.utc)
-    rec_expiration = rec.expiration_date
-    if rec_expiration.tzinfo is None:
-        rec_expiration = rec_expiration.replace(tzinfo=timezone.utc)
+    # The policy KDF, the spool write and the enqueue commit all block, so none run on the event loop.
+    max_downloads, expiration_date = await run_in_threadpool(
+        _apply_policy, policy_b64, public_key, max_downloads, expiration_date
+    )
+
+    service = UploadJobService(db)
+    if file is not None:
+        spool_path = await run_in_threadpool(service.spool, file.file)
+        display_name = file.filename
     else:
-        rec_expiration = rec_expiration.astimezone(timezone.utc)
-    if rec_expiration <= now_utc:
-        raise HTTPException(status_code=410, detail="Link expired")
+        spool_path = await run_in_threadpool(service.spool, BytesIO(text.encode("utf-8")))
+        display_name = "message.txt"
 
-    if rec.download_count >= rec.max_downloads:
-        raise HTTPException(status_code=429, detail="Download limit reached")
+    def enqueue():
+        job = service.enqueue(
+            name=display_name,
+            spool_path=spool_path,
+            public_key=public_key,
+            max_downloads=max_downloads,
+            expiration_date=expiration_date,
+        )
+        # Read the columns here: after the commit they are reloaded from the database.
+        return job.id, job.download_token, job.status
 
-    encryptor = Encryptor(public_key, salt=rec.salt)
-    try:
-        plaintext = encryptor.decrypt(rec.content)
-    except Exception:
-        raise HTTPException(status_code=400, detail="Invalid public key or corrupted file")
+    job_id, token, status = await run_in_threadpool(enqueue)
+    pipeline = getattr(request.app.state, "upload_pipeline", None)
+    if pipeline is not None:
+        pipeline.submit(job_id)
+
+    return {
+        "status_code": 202,
+        "download_token": token,
+        "status": status,
+        "status_url": f"/files/upload/status/{token}",
+    }
+
+
+def _job_status(db: Session, token: str) -> dict | None:
+    job: UploadJob | None = db.query(UploadJob).filter_by(download_token=token).first()
+    if not job:
+        return None
+    status = {"download_token": job.download_token, "status": job.status, "error": job.error}
+    # End the read transaction so the next poll sees the worker's commit.
+    db.rollback()
+    return status
+
+
+@router.get("/files/upload/status/{token}")
+async def upload_status(
+    token: str,
+    wait: float = 0,
+    db: Session = Depends(get_db),
+):
+    """Report an async upload's state; ``wait`` long-polls up to that many seconds for it to finish."""
+    # Only the short query runs in the threadpool; waiting happens on the event
+    # loop so long-polling clients cannot exhaust the threads sync routes need.
+    deadline = time.monotonic() + max(0.0, min(wait, UPLOAD_STATUS_MAX_WAIT))
+    while True:
+        status = await run_in_threadpool(_job_status, db, token)
+        if status is None:
+            raise HTTPException(status_code=404, detail="Upload not found")
+        if status["status"] in (JOB_READY, JOB_FAILED) or time.monotonic() >= deadline:
+            return status
+        await asyncio.sleep(0.25)
+
+
+@router.get("/files/upload/queue")
+def upload_queue_stats(db: Session = Depends(get_db)):
+    return UploadJobService(db).queue_stats()
+
+
+@router.post("/files/text")
+def upload_text(payload: TextUpload, db: Session = Depends(get_db)):
+    raw_bytes = payload.text.encode("utf-8")
+    if not raw_bytes:
+        raise HTTPException(status_code=400, detail="Provide a non-empty 'text'")
+    if len(raw_bytes) > TEXT_MAX_BYTES:
+        raise HTTPException(status_code=413, detail=f"Text exceeds {TEXT_MAX_BYTES} bytes")
+
+    max_downloads, expiration_date = _apply_policy(
+        payload.policy_b64, payload.public_key, payload.max_downloads, payload.expiration_date
+    )
+
+    encryptor = Encryptor(payload.public_key)
+    token = EncryptedFileService(db).insert_returning_token(
+        name="message.txt",
+        content=encryptor.encrypt(raw_bytes, FORMAT_AESGCM),
+        salt=encryptor.get_salt(),
+        key=encryptor.get_key(),
+        max_downloads=max_downloads,
+        expiration_date=expiration_date,
+        format_version=FORMAT_AESGCM,
+    )
+
+    return {
+        "status_code": 200,
+        "download_token": token,
+    }
+
+
+@router.get("/files/download/{token}")
+def download_file_by_token(
+    token: str,
+    public_key: str,
+    db: Session = Depends(get_db),
+):
+    rec = _get_downloadable(db, token)
+    plaintext = _decrypt_record(db, rec, public_key)
 
     return StreamingResponse(
         BytesIO(plaintext),
@@ -119,28 +286,30 @@ def download_file_by_token(
     )
 
 
+@router.get("/files/text/{token}")
+def download_text_by_token(
+    token: str,
+    public_key: str,
+    db: Session = Depends(get_db),
+):
+    rec = _get_downloadable(db, token)
+    plaintext = _decrypt_record(db, rec, public_key)
+    try:
+        text = plaintext.decode("utf-8")
+    except UnicodeDecodeError:
+        raise HTTPException(status_code=415, detail="File is not UTF-8 text")
+
+    return {"name": rec.name, "text": text}
+
+
 @router.post("/files/download/ack/{token}")
 def acknowledge_successful_download(
     token: str,
     db: Session = Depends(get_db),
 ):
-    rec: EncryptedFile | None = db.query(EncryptedFile).filter_by(download_token=token).first()
-    if not rec:
-        raise HTTPException(status_code=404, detail="File not found")
-
-    now_utc = datetime.now(timezone.utc)
-    rec_expiration = rec.expiration_date
-    if rec_expiration.tzinfo is None:
-        rec_expiration = rec_expiration.replace(tzinfo=timezone.utc)
-    else:
-        rec_expiration = rec_expiration.astimezone(timezone.utc)
-    if rec_expiration <= now_utc:
-        raise HTTPException(status_code=410, detail="Link expired")
+    rec = _get_downloadable(db, token)
 
-    if rec.download_count >= rec.max_downloads:
+    if not EncryptedFileService(db).acknowledge_download(rec):
         raise HTTPException(status_code=429, detail="Download limit reached")
 
-    rec.download_count += 1
-    db.commit()
-
     return {"status": "ok"}
@@ -0,0 +1,161 @@
+from fastapi import APIRouter, UploadFile, File, Form, Depends, HTTPException
+from fastapi.responses import StreamingResponse
+from io import BytesIO
+from app.services.envelope_service import EnvelopeService
+from app.services.encrypted_file_service import EncryptedFileService
+from app.models.encrypted_file import EncryptedFile
+from app.models.recipient_key import RecipientKey
+from app.database import get_db
+from sqlalchemy.orm import Session
+from datetime import datetime, timezone
+
+router = APIRouter()
+
+
+def _get_shared_file(db: Session, owner_token: str, owner_key: str) -> tuple[EncryptedFile, bytes]:
+    rec: EncryptedFile | None = (
+        db.query(EncryptedFile).filter_by(download_token=owner_token, is_envelope=True).first()
+    )
+    if not rec:
+        raise HTTPException(status_code=404, detail="File not found")
+    try:
+        dek = EnvelopeService(db).unwrap_for_owner(rec, owner_key)
+    except Exception:
+        raise HTTPException(status_code=403, detail="Invalid owner key")
+    return rec, dek
+
+
+def _get_recipient(db: Session, token: str) -> RecipientKey:
+    recipient: RecipientKey | None = db.query(RecipientKey).filter_by(download_token=token).first()
+    if not recipient:
+        raise HTTPException(status_code=404, detail="File not found")
+
+    now_utc = datetime.now(timezone.utc)
+    expiration = recipient.expiration_date
+    if expiration.tzinfo is None:
+        expiration = expiration.replace(tzinfo=timezone.utc)
+    else:
+        expiration = expiration.astimezone(timezone.utc)
+    if expiration <= now_utc:
+        raise HTTPException(status_code=410, detail="Link expired")
+
+    if recipient.download_count >= recipient.max_downloads:
+        raise HTTPException(status_code=429, detail="Download limit reached")
+    return recipient
+
+
+def _get_recipient_file(db: Session, recipient: RecipientKey) -> EncryptedFile:
+    rec: EncryptedFile = db.get(EncryptedFile, recipient.file_id)
+    if rec.quarantined_at is not None:
+        raise HTTPException(status_code=409, detail="File failed integrity check")
+    return rec
+
+
+@router.post("/files/shared")
+def upload_shared_file(
+    file: UploadFile | None = File(default=None),
+    text: str | None = Form(default=None),
+    owner_key: str = Form(...),
+    recipient_keys: list[str] = Form(default=[]),
+    max_downloads: int = Form(...),
+    expiration_date: datetime = Form(...),
+    db: Session = Depends(get_db),
+):
+    provided = [(file is not None), (text is not None and text != "")]
+    if sum(provided) != 1:
+        raise HTTPException(status_code=400, detail="Provide exactly one of 'file' or 'text'")
+
+    if file is not None:
+        raw_bytes = file.file.read()
+        display_name = file.filename
+    else:
+        raw_bytes = text.encode("utf-8")
+        display_name = "message.txt"
+
+    # Sync route: the per-recipient key derivations run in the threadpool, not on the event loop.
+    rec, _, recipients = EnvelopeService(db).create(
+        name=display_name,
+        plaintext=raw_bytes,
+        owner_key=owner_key,
+        max_downloads=max_downloads,
+        expiration_date=expiration_date,
+        recipient_keys=recipient_keys,
+    )
+
+    return {
+        "status_code": 200,
+        "owner_token": rec.download_token,
+        "download_tokens": [r.download_token for r in recipients],
+    }
+
+
+@router.post("/files/shared/{owner_token}/recipients")
+def add_recipient(
+    owner_token: str,
+    owner_key: str = Form(...),
+    public_key: str = Form(...),
+    max_downloads: int | None = Form(default=None),
+    expiration_date: datetime | None = Form(default=None),
+    db: Session = Depends(get_db),
+):
+    rec, dek = _get_shared_file(db, owner_token, owner_key)
+    recipient = EnvelopeService(db).add_recipient(
+        rec,
+        dek,
+        public_key=public_key,
+        max_downloads=max_downloads if max_downloads is not None else rec.max_downloads,
+        expiration_date=expiration_date or rec.expiration_date,
+    )
+    return {"status_code": 200, "download_token": recipient.download_token}
+
+
+@router.delete("/files/shared/{owner_token}/recipients/{token}")
+def revoke_recipient(
+    owner_token: str,
+    token: str,
+    owner_key: str,
+    db: Session = Depends(get_db),
+):
+    rec, _ = _get_shared_file(db, owner_token, owner_key)
+    if not EnvelopeService(db).revoke(rec, token):
+        raise HTTPException(status_code=404, detail="Recipient not found")
+    return {"status": "ok"}
+
+
+@router.get("/files/shared/download/{token}")
+def download_shared_file(
+    token: str,
+    public_key: str,
+    db: Session = Depends(get_db),
+):
+    recipient = _get_recipient(db, token)
+    rec = _get_recipient_file(db, recipient)
+
+    content = EncryptedFileService(db).load_verified(rec)
+    if content is None:
+        raise HTTPException(status_code=409, detail="File failed integrity check")
+
+    try:
+        plaintext = EnvelopeService(db).decrypt_for_recipient(recipient, content, rec.format_version, public_key)
+    except Exception:
+        raise HTTPException(status_code=400, detail="Invalid public key or corrupted file")
+
+    return StreamingResponse(
+        BytesIO(plaintext),
+        media_type="application/octet-stream",
+        headers={"Content-Disposition": f'attachment; filename="{rec.name}"'},
+    )
+
+
+@router.post("/files/shared/download/ack/{token}")
+def acknowledge_shared_download(
+    token: str,
+    db: Session = Depends(get_db),
+):
+    recipient = _get_recipient(db, token)
+    _get_recipient_file(db, recipient)
+
+    if not EnvelopeService(db).acknowledge_download(recipient):
+        raise HTTPException(status_code=429, detail="Download limit reached")
+
+    return {"status": "ok"}
@@ -0,0 +1,41 @@
+import os
+import secrets
+from pathlib import Path
+
+BLOB_STORE_DIR = os.getenv("BLOB_STORE_DIR", "./blobs")
+
+
+class LocalBlobStore:
+    """Stores ciphertext on the local filesystem, keyed by the row's ``blob_key``."""
+
+    def __init__(self, root: str | os.PathLike = BLOB_STORE_DIR):
+        self.root = Path(root)
+
+    def path_for(self, key: str) -> Path:
+        # Keys start with the hex download token, so the first two characters shard evenly.
+        return self.root / key[:2] / key
+
+    @staticmethod
+    def new_key(token: str) -> str:
+        """Fresh blob name for ``token``; blobs are never rewritten in place."""
+        return f"{token}-{secrets.token_hex(6)}"
+
+    def put(self, key: str, data: bytes) -> None:
+        path = self.path_for(key)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = path.with_suffix(".tmp")
+        with open(tmp, "wb") as fh:
+            fh.write(data)
+            fh.flush()
+            os.fsync(fh.fileno())
+        os.replace(tmp, path)
+
+    def get(self, key: str) -> bytes:
+        with open(self.path_for(key), "rb") as fh:
+            return fh.read()
+
+    def delete(self, key: str) -> None:
+        try:
+            os.remove(self.path_for(key))
+        except FileNotFoundError:
+            pass
@@ -1,19 +1,28 @@
 import secrets, hashlib
+from datetime import datetime, timezone
+from sqlalchemy import delete, insert, update
 from sqlalchemy.exc import IntegrityError
 from sqlalchemy.orm import Session
-from app.models.encrypted_file import EncryptedFile
+from app.models.encrypted_file import EncryptedFile, STORAGE_FS
+from app.models.recipient_key import RecipientKey
+from app.services.blob_store import LocalBlobStore
+from app.services.encryptor import Encryptor, KDF_ITERATIONS, CURRENT_FORMAT_VERSION
 
 class EncryptedFileService:
-    def __init__(self, db_session: Session):
+    def __init__(self, db_session: Session, blob_store: LocalBlobStore | None = None):
         self.db_session = db_session
+        self.blob_store = blob_store or LocalBlobStore()
 
     def save_file(
         self, *, name: str, content: bytes, salt: bytes, key: bytes,
-        max_downloads: int, expiration_date
+        max_downloads: int, expiration_date,
+        format_version: int = CURRENT_FORMAT_VERSION, is_envelope: bool = False,
+        download_token: str | None = None
     ) -> EncryptedFile:
 
-        for _ in range(5):  # retry on rare token collisions
-            token = self.new_token_b62()
+        # A token handed out in advance (async uploads) cannot be swapped on collision.
+        attempts = 1 if download_token is not None else 5
+        for _ in range(attempts):  # retry on rare token collisions
             rec = EncryptedFile(
                 name=name,
                 content=content,
@@ -21,7 +30,10 @@ class EncryptedFileService:
                 key=key,
                 max_downloads=max_downloads,
                 expiration_date=expiration_date,
-                download_token=self.token_digest(token)
+                download_token=download_token or self.token_digest(self.new_token_b62()),
+                content_sha256=self.content_digest(content),
+                format_version=format_version,
+                is_envelope=is_envelope,
             )
             self.db_session.add(rec)
             try:
@@ -32,6 +44,137 @@ class EncryptedFileService:
                 self.db_session.rollback()
         raise RuntimeError("Failed to generate unique download token")
 
+    def insert_returning_token(
+        self, *, name: str, content: bytes, salt: bytes, key: bytes,
+        max_downloads: int, expiration_date, format_version: int
+    ) -> str:
+        """Lean insert for the text fast path: one INSERT ... RETURNING, no ORM refresh."""
+        for _ in range(5):  # retry on rare token collisions
+            stmt = (
+                insert(EncryptedFile)
+                .values(
+                    name=name,
+                    content=content,
+                    salt=salt,
+                    key=key,
+                    max_downloads=max_downloads,
+                    expiration_date=expiration_date,
+                    download_token=self.token_digest(self.new_token_b62()),
+                    content_sha256=self.content_digest(content),
+                    format_version=format_version,
+                )
+                .returning(EncryptedFile.download_token)
+            )
+            try:
+                token = self.db_session.execute(stmt).scalar_one()
+                self.db_session.commit()
+                return token
+            except IntegrityError:
+                self.db_session.rollback()
+        raise RuntimeError("Failed to generate unique download token")
+
+    def acknowledge_download(self, rec: EncryptedFile) -> bool:
+        # Single conditional UPDATE so concurrent acks can never exceed max_downloads.
+        result = self.db_session.execute(
+            update(EncryptedFile)
+            .where(
+                EncryptedFile.id == rec.id,
+                EncryptedFile.download_count < EncryptedFile.max_downloads,
+            )
+            .values(download_count=EncryptedFile.download_count + 1)
+            .execution_options(synchronize_session=False)
+        )
+        self.db_session.commit()
+        return result.rowcount == 1
+
+    def purge_expired(self, older_than: datetime) -> int:
+        """Delete rows that expired before ``older_than``; returns how many were removed."""
+        # Recipient keys never outlive their file, so this also clears keys of purged files.
+        recipients = self.db_session.execute(
+            delete(RecipientKey)
+            .where(RecipientKey.expiration_date < older_than)
+            .execution_options(synchronize_session=False)
+        ).rowcount
+        rows = self.db_session.execute(
+            delete(EncryptedFile)
+            .where(EncryptedFile.expiration_date < older_than)
+            .returning(EncryptedFile.blob_key, EncryptedFile.storage)
+            .execution_options(synchronize_session=False)
+        ).all()
+        self.db_session.commit()
+        for blob_key, storage in rows:
+            if storage == STORAGE_FS:
+                self.blob_store.delete(blob_key)
+        return recipients + len(rows)
+
+    def load_content(self, rec: EncryptedFile) -> bytes:
+        if rec.storage == STORAGE_FS:
+            return self.blob_store.get(rec.blob_key)
+        return rec.content
+
+    def verify_content(self, rec: EncryptedFile, content: bytes) -> bool:
+        # Rows written before checksums existed cannot be verified and are assumed intact.
+        return rec.content_sha256 is None or rec.content_sha256 == self.content_digest(content)
+
+    def quarantine(self, rec: EncryptedFile) -> bool:
+        """Quarantine ``rec`` unless its content was rewritten since it was loaded."""
+        # A rewrite switches blob_key and content_sha256 together, so a reader that raced
+        # it must not quarantine the healthy new version based on the old checksum.
+        result = self.db_session.execute(
+            update(EncryptedFile)
+            .where(
+                EncryptedFile.id == rec.id,
+                EncryptedFile.content_sha256.is_not_distinct_from(rec.content_sha256),
+                EncryptedFile.blob_key.is_not_distinct_from(rec.blob_key),
+            )
+            .values(quarantined_at=datetime.now(timezone.utc))
+            .execution_options(synchronize_session=False)
+        )
+        self.db_session.commit()
+        return result.rowcount == 1
+
+    def load_verified(self, rec: EncryptedFile) -> bytes | None:
+        """Return ``rec``'s content if it matches its checksum; quarantines and returns None otherwise."""
+        for _ in range(2):
+            try:
+                content = self.load_content(rec)
+            except OSError:
+                content = None
+            if content is not None and self.verify_content(rec, content):
+                return content
+            if self.quarantine(rec):
+                return None
+            # Rewritten while we read it: check the version the row points at now.
+            self.db_session.refresh(rec)
+        return None
+
+    def migrate_on_download(self, rec: EncryptedFile, public_key: str, plaintext: bytes) -> None:
+        """Rewrite a row flagged by the re-encryption job now that the public key is known."""
+        encryptor = Encryptor(public_key)
+        content = encryptor.encrypt(plaintext, rec.format_version)
+        old_blob = new_blob = None
+        if rec.storage == STORAGE_FS:
+            # Write under a new name and switch the row to it in the commit below,
+            # so the committed row always points at a blob matching its key and checksum.
+            old_blob, new_blob = rec.blob_key, self.blob_store.new_key(rec.download_token)
+            self.blob_store.put(new_blob, content)
+            rec.blob_key = new_blob
+        else:
+            rec.content = content
+        rec.content_sha256 = self.content_digest(content)
+        rec.salt = encryptor.get_salt()
+        rec.key = encryptor.get_key()
+        rec.kdf_iterations = KDF_ITERATIONS
+        rec.needs_migration = False
+        try:
+            self.db_session.commit()
+        except Exception:
+            if new_blob:
+                self.blob_store.delete(new_blob)
+            raise
+        if old_blob:
+            self.blob_store.delete(old_blob)
+
     def new_token_b62(self, nbytes: int = 16) -> str:
         alphabet = "0123456789abcdefghijklmnopqrstuvwxyzABCDEFGHIJKLMNOPQRSTUVWXYZ"
         n = int.from_bytes(secrets.token_bytes(nbytes), "big")
@@ -43,3 +186,7 @@ class EncryptedFileService:
 
     def token_digest(self, token: str) -> str:
         return hashlib.sha256(token.encode()).hexdigest()
+
+    @staticmethod
+    def content_digest(content: bytes) -> str:
+        return hashlib.sha256(content).hexdigest()
@@ -4,32 +4,64 @@ import hashlib
 import os
 from cryptography.fernet import Fernet
 from cryptography.hazmat.primitives import hashes
+from cryptography.hazmat.primitives.ciphers.aead import AESGCM
 from cryptography.hazmat.primitives.kdf.pbkdf2 import PBKDF2HMAC
 
+# PBKDF2 work factor for newly derived keys. Rows remember the value they were
+# derived with (EncryptedFile.kdf_iterations) so this can be raised safely.
+KDF_ITERATIONS = 1_200_000
+
+# Ciphertext layouts understood by Encryptor.
+FORMAT_FERNET = 1
+# Compact layout: nonce(12) | AES-256-GCM ciphertext+tag, no base64 or header.
+FORMAT_AESGCM = 2
+CURRENT_FORMAT_VERSION = FORMAT_FERNET
+
+
 class Encryptor:
-    def __init__(self, public_key: str, salt: bytes | None = None):
+    def __init__(self, public_key: str, salt: bytes | None = None, iterations: int = KDF_ITERATIONS):
         self.public_key = bytes(public_key, "utf-8")
         self.salt = salt if salt is not None else os.urandom(16)
+        self.iterations = iterations
         self.key = self.generate_key()
         self.fernet = Fernet(self.key)
 
+    @classmethod
+    def from_key(cls, key: bytes, salt: bytes, iterations: int = KDF_ITERATIONS):
+        # Rebuild an encryptor from an already derived key, skipping the KDF.
+        self = cls.__new__(cls)
+        self.public_key = None
+        self.salt = salt
+        self.iterations = iterations
+        self.key = key
+        self.fernet = Fernet(key)
+        return self
+
     def generate_key(self):
         kdf = PBKDF2HMAC(
             algorithm=hashes.SHA256(),
             length=32,
             salt=self.salt,
-            iterations=1_200_000,
+            iterations=self.iterations,
         )
         return base64.urlsafe_b64encode(kdf.derive(self.public_key))
-    
-    def encrypt(self, data):
+
+    def encrypt(self, data, format_version: int = FORMAT_FERNET):
+        if format_version == FORMAT_AESGCM:
+            nonce = os.urandom(12)
+            return nonce + self._aesgcm().encrypt(nonce, data, None)
         return self.fernet.encrypt(data)
-    
-    def decrypt(self, data):
+
+    def decrypt(self, data, format_version: int = FORMAT_FERNET):
+        if format_version == FORMAT_AESGCM:
+            return self._aesgcm().decrypt(data[:12], data[12:], None)
         return self.fernet.decrypt(data)
-    
+
+    def _aesgcm(self):
+        return AESGCM(base64.urlsafe_b64decode(self.key))
+
     def get_salt(self):
         return self.salt
-    
+
     def get_key(self):
         return self.key
@@ -0,0 +1,131 @@
+import base64
+import os
+from datetime import datetime, timezone
+from sqlalchemy import update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+from app.models.encrypted_file import EncryptedFile
+from app.models.recipient_key import RecipientKey
+from app.services.encrypted_file_service import EncryptedFileService
+from app.services.encryptor import Encryptor, FORMAT_AESGCM
+
+
+class EnvelopeService:
+    """Shared files: content is encrypted once with a random data key (DEK).
+
+    The DEK is wrapped with a key derived from the owner's key (stored on the
+    encrypted_files row) and from each recipient's public key (one
+    recipient_keys row each). Adding or revoking a recipient only touches a
+    recipient_keys row; the ciphertext is never rewritten.
+    """
+
+    def __init__(self, db_session: Session):
+        self.db_session = db_session
+        self.files = EncryptedFileService(db_session)
+
+    def create(
+        self, *, name: str, plaintext: bytes, owner_key: str,
+        max_downloads: int, expiration_date, recipient_keys: list[str] = ()
+    ) -> tuple[EncryptedFile, bytes, list[RecipientKey]]:
+        """Store the file and one recipient_keys row per public key in a single transaction."""
+        dek = base64.urlsafe_b64encode(os.urandom(32))
+        content = Encryptor.from_key(dek, b"").encrypt(plaintext, FORMAT_AESGCM)
+        # Derive every wrapping key before opening the transaction.
+        owner = Encryptor(owner_key)
+        encryptors = [Encryptor(public_key) for public_key in recipient_keys]
+        for _ in range(5):  # retry on rare token collisions
+            rec = EncryptedFile(
+                name=name,
+                content=content,
+                salt=owner.get_salt(),
+                key=owner.encrypt(dek),
+                max_downloads=max_downloads,
+                expiration_date=expiration_date,
+                download_token=self.files.token_digest(self.files.new_token_b62()),
+                content_sha256=self.files.content_digest(content),
+                format_version=FORMAT_AESGCM,
+                is_envelope=True,
+            )
+            self.db_session.add(rec)
+            try:
+                self.db_session.flush()
+                recipients = [
+                    self._new_recipient(rec, dek, encryptor, max_downloads, expiration_date)
+                    for encryptor in encryptors
+                ]
+                self.db_session.add_all(recipients)
+                self.db_session.commit()
+                return rec, dek, recipients
+            except IntegrityError:
+                self.db_session.rollback()
+        raise RuntimeError("Failed to generate unique download token")
+
+    def unwrap_for_owner(self, rec: EncryptedFile, owner_key: str) -> bytes:
+        """Return the DEK; raises ``cryptography.fernet.InvalidToken`` for a wrong owner key."""
+        return Encryptor(owner_key, salt=rec.salt, iterations=rec.kdf_iterations).decrypt(rec.key)
+
+    def add_recipient(
+        self, rec: EncryptedFile, dek: bytes, *, public_key: str,
+        max_downloads: int, expiration_date
+    ) -> RecipientKey:
+        encryptor = Encryptor(public_key)
+        for _ in range(5):  # retry on rare token collisions
+            recipient = self._new_recipient(rec, dek, encryptor, max_downloads, expiration_date)
+            self.db_session.add(recipient)
+            try:
+                self.db_session.commit()
+                return recipient
+            except IntegrityError:
+                self.db_session.rollback()
+        raise RuntimeError("Failed to generate unique download token")
+
+    def _new_recipient(
+        self, rec: EncryptedFile, dek: bytes, encryptor: Encryptor, max_downloads: int, expiration_date
+    ) -> RecipientKey:
+        return RecipientKey(
+            file_id=rec.id,
+            download_token=self.files.token_digest(self.files.new_token_b62()),
+            salt=encryptor.get_salt(),
+            wrapped_key=encryptor.encrypt(dek),
+            kdf_iterations=encryptor.iterations,
+            max_downloads=max_downloads,
+            # A recipient never outlives the file, so purging the file purges its keys.
+            expiration_date=min(_as_utc(expiration_date), _as_utc(rec.expiration_date)),
+        )
+
+    def revoke(self, rec: EncryptedFile, recipient_token: str) -> bool:
+        recipient = (
+            self.db_session.query(RecipientKey)
+            .filter_by(file_id=rec.id, download_token=recipient_token)
+            .first()
+        )
+        if recipient is None:
+            return False
+        self.db_session.delete(recipient)
+        self.db_session.commit()
+        return True
+
+    def decrypt_for_recipient(self, recipient: RecipientKey, content: bytes, format_version: int, public_key: str) -> bytes:
+        encryptor = Encryptor(public_key, salt=recipient.salt, iterations=recipient.kdf_iterations)
+        dek = encryptor.decrypt(recipient.wrapped_key)
+        return Encryptor.from_key(dek, b"").decrypt(content, format_version)
+
+    def acknowledge_download(self, recipient: RecipientKey) -> bool:
+        # Single conditional UPDATE so concurrent acks can never exceed max_downloads.
+        result = self.db_session.execute(
+            update(RecipientKey)
+            .where(
+                RecipientKey.id == recipient.id,
+                RecipientKey.download_count < RecipientKey.max_downloads,
+            )
+            .values(download_count=RecipientKey.download_count + 1)
+            .execution_options(synchronize_session=False)
+        )
+        self.db_session.commit()
+        return result.rowcount == 1
+
+
+def _as_utc(value: datetime) -> datetime:
+    if value.tzinfo is None:
+        return value.replace(tzinfo=timezone.utc)
+    return value.astimezone(timezone.utc)
@@ -0,0 +1,241 @@
+import logging
+import os
+import shutil
+import threading
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta, timezone
+from sqlalchemy import delete, func, or_, select, update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session, sessionmaker
+from app.models.encrypted_file import EncryptedFile
+from app.models.upload_job import UploadJob, JOB_PENDING, JOB_PROCESSING, JOB_READY, JOB_FAILED
+from app.services.encrypted_file_service import EncryptedFileService
+from app.services.encryptor import Encryptor
+
+logger = logging.getLogger(__name__)
+
+UPLOAD_SPOOL_DIR = os.getenv("UPLOAD_SPOOL_DIR", "./spool")
+# Jobs only run inside API processes; there is no standalone worker, so with
+# UPLOAD_WORKERS=0 in every process accepted jobs stay pending forever.
+UPLOAD_WORKERS = int(os.getenv("UPLOAD_WORKERS", "2"))
+# A job still "processing" after this long is assumed to belong to a dead process.
+UPLOAD_JOB_LEASE_SECONDS = float(os.getenv("UPLOAD_JOB_LEASE_SECONDS", "900"))
+UPLOAD_RECOVER_INTERVAL_SECONDS = float(os.getenv("UPLOAD_RECOVER_INTERVAL_SECONDS", "60"))
+
+
+class UploadJobService:
+    """Accept-then-process uploads: spool now, derive/encrypt/persist later."""
+
+    def __init__(self, db_session: Session, spool_dir: str | os.PathLike | None = None):
+        self.db_session = db_session
+        self.spool_dir = spool_dir or UPLOAD_SPOOL_DIR
+
+    def spool(self, source) -> str:
+        """Copy a file object to the spool directory and fsync it; returns the path."""
+        # Spool files hold plaintext: owner-only directory and files, whatever the umask.
+        os.makedirs(self.spool_dir, mode=0o700, exist_ok=True)
+        os.chmod(self.spool_dir, 0o700)
+        path = os.path.join(self.spool_dir, uuid.uuid4().hex)
+        fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o600)
+        with os.fdopen(fd, "wb") as fh:
+            shutil.copyfileobj(source, fh, 1024 * 1024)
+            fh.flush()
+            os.fsync(fh.fileno())
+        return path
+
+    def enqueue(
+        self, *, name: str, spool_path: str, public_key: str,
+        max_downloads: int, expiration_date
+    ) -> UploadJob:
+        files = EncryptedFileService(self.db_session)
+        for _ in range(5):  # retry on rare token collisions
+            job = UploadJob(
+                download_token=files.token_digest(files.new_token_b62()),
+                name=name,
+                spool_path=spool_path,
+                public_key=public_key,
+                max_downloads=max_downloads,
+                expiration_date=expiration_date,
+            )
+            self.db_session.add(job)
+            try:
+                self.db_session.commit()
+                return job
+            except IntegrityError:
+                self.db_session.rollback()
+        raise RuntimeError("Failed to generate unique download token")
+
+    def process(self, job_id: int) -> UploadJob | None:
+        """Run one job; returns None if another worker already claimed it."""
+        claimed = self.db_session.execute(
+            update(UploadJob)
+            .where(UploadJob.id == job_id, UploadJob.status == JOB_PENDING)
+            .values(status=JOB_PROCESSING, started_at=datetime.now(timezone.utc))
+            .execution_options(synchronize_session=False)
+        ).rowcount
+        self.db_session.commit()
+        if not claimed:
+            return None
+
+        job = self.db_session.get(UploadJob, job_id)
+        try:
+            # A crash after persisting but before marking the job leaves the file in place.
+            exists = self.db_session.query(EncryptedFile.id).filter_by(download_token=job.download_token).first()
+            if not exists:
+                with open(job.spool_path, "rb") as fh:
+                    raw_bytes = fh.read()
+                encryptor = Encryptor(job.public_key)
+                EncryptedFileService(self.db_session).save_file(
+                    name=job.name,
+                    content=encryptor.encrypt(raw_bytes),
+                    salt=encryptor.get_salt(),
+                    key=encryptor.get_key(),
+                    max_downloads=job.max_downloads,
+                    expiration_date=job.expiration_date,
+                    download_token=job.download_token,
+                )
+            job.status = JOB_READY
+        except Exception as exc:
+            self.db_session.rollback()
+            # A worker that took over an expired lease may have stored the file meanwhile.
+            if self.db_session.query(EncryptedFile.id).filter_by(download_token=job.download_token).first():
+                job.status = JOB_READY
+            else:
+                logger.exception("upload job %s failed", job_id)
+                job.status = JOB_FAILED
+                job.error = f"{type(exc).__name__}: {exc}"[:255]
+        job.public_key = None
+        job.finished_at = datetime.now(timezone.utc)
+        self.db_session.commit()
+        try:
+            os.remove(job.spool_path)
+        except FileNotFoundError:
+            pass
+        return job
+
+    def recover(self, lease_seconds: float = UPLOAD_JOB_LEASE_SECONDS) -> list[int]:
+        """Requeue jobs interrupted by a restart; returns pending job ids in order."""
+        # Other API processes (uvicorn --workers N) may be running jobs right now;
+        # only jobs whose lease has expired are taken over.
+        stale = datetime.now(timezone.utc) - timedelta(seconds=lease_seconds)
+        self.db_session.execute(
+            update(UploadJob)
+            .where(
+                UploadJob.status == JOB_PROCESSING,
+                or_(UploadJob.started_at.is_(None), UploadJob.started_at < stale),
+            )
+            .values(status=JOB_PENDING, started_at=None)
+            .execution_options(synchronize_session=False)
+        )
+        self.db_session.commit()
+        return list(self.db_session.scalars(
+            select(UploadJob.id).where(UploadJob.status == JOB_PENDING).order_by(UploadJob.id)
+        ))
+
+    def queue_stats(self, recent: int = 100) -> dict:
+        now = datetime.now(timezone.utc)
+        counts = dict(
+            self.db_session.execute(select(UploadJob.status, func.count()).group_by(UploadJob.status)).all()
+        )
+        oldest = self.db_session.scalar(
+            select(func.min(UploadJob.created_at)).where(UploadJob.status.in_([JOB_PENDING, JOB_PROCESSING]))
+        )
+        finished = self.db_session.execute(
+            select(UploadJob.created_at, UploadJob.finished_at)
+            .where(UploadJob.status == JOB_READY)
+            .order_by(UploadJob.finished_at.desc())
+            .limit(recent)
+        ).all()
+        latencies = [(_as_utc(done) - _as_utc(created)).total_seconds() for created, done in finished]
+        return {
+            "pending": counts.get(JOB_PENDING, 0),
+            "processing": counts.get(JOB_PROCESSING, 0),
+            "failed": counts.get(JOB_FAILED, 0),
+            "queue_depth": counts.get(JOB_PENDING, 0) + counts.get(JOB_PROCESSING, 0),
+            "oldest_pending_age_seconds": (now - _as_utc(oldest)).total_seconds() if oldest else 0.0,
+            "recent_mean_latency_seconds": sum(latencies) / len(latencies) if latencies else 0.0,
+        }
+
+    def purge_finished(self, older_than: datetime) -> int:
+        result = self.db_session.execute(
+            delete(UploadJob)
+            .where(UploadJob.status.in_([JOB_READY, JOB_FAILED]), UploadJob.finished_at < older_than)
+            .execution_options(synchronize_session=False)
+        )
+        self.db_session.commit()
+        return result.rowcount
+
+
+class UploadPipeline:
+    """Worker pool that processes upload jobs in the API process.
+
+    Besides recovering at startup, the pipeline re-runs ``recover`` every
+    ``recover_interval`` seconds so jobs whose lease expires while the
+    process is running (e.g. a sibling was killed mid-job) are picked up.
+    """
+
+    def __init__(
+        self, session_factory: sessionmaker, workers: int = UPLOAD_WORKERS, *,
+        lease_seconds: float = UPLOAD_JOB_LEASE_SECONDS,
+        recover_interval: float = UPLOAD_RECOVER_INTERVAL_SECONDS,
+    ):
+        self.session_factory = session_factory
+        self.lease_seconds = lease_seconds
+        self.recover_interval = recover_interval
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="upload")
+        self._queued: set[int] = set()
+        self._lock = threading.Lock()
+        self._stopped = threading.Event()
+        self._recover_thread = threading.Thread(
+            target=self._recover_periodically, name="upload-recover", daemon=True
+        )
+
+    def start(self) -> None:
+        job_ids = self.recover()
+        if job_ids:
+            logger.info("resuming %d pending upload jobs", len(job_ids))
+        self._recover_thread.start()
+
+    def recover(self) -> list[int]:
+        """Requeue expired leases and submit every pending job not already queued here."""
+        with self.session_factory() as db:
+            job_ids = UploadJobService(db).recover(self.lease_seconds)
+        for job_id in job_ids:
+            self.submit(job_id)
+        return job_ids
+
+    def _recover_periodically(self) -> None:
+        while not self._stopped.wait(self.recover_interval):
+            try:
+                self.recover()
+            except Exception:
+                logger.exception("upload job recovery failed")
+
+    def submit(self, job_id: int) -> None:
+        with self._lock:
+            if job_id in self._queued:
+                return
+            self._queued.add(job_id)
+        self.executor.submit(self._run, job_id)
+
+    def _run(self, job_id: int) -> None:
+        try:
+            with self.session_factory() as db:
+                UploadJobService(db).process(job_id)
+        except Exception:
+            logger.exception("upload job %s crashed", job_id)
+        finally:
+            with self._lock:
+                self._queued.discard(job_id)
+
+    def shutdown(self) -> None:
+        self._stopped.set()
+        # Queued jobs stay pending in the database and are picked up by the next start().
+        self.executor.shutdown(wait=False, cancel_futures=True)
+
+
+def _as_utc(value: datetime) -> datetime:
+    if value.tzinfo is None:
+        return value.replace(tzinfo=timezone.utc)
+    return value.astimezone(timezone.utc)
@@ -0,0 +1,76 @@
+"""Compare the stock SQLite setup against the tuned embedded profile.
+
+Usage:
+    python benchmarks/bench_sqlite.py --threads 16 --uploads 2000
+
+Each run creates a fresh database file, then has ``--threads`` threads call
+``EncryptedFileService.save_file`` followed by an ack, and reports throughput
+and the number of operations that failed (typically ``database is locked``).
+"""
+import argparse
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+
+from sqlalchemy import create_engine
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from app.database import Base, create_sqlite_engines, make_sessionmaker  # noqa: E402
+from app.services.encrypted_file_service import EncryptedFileService  # noqa: E402
+
+PAYLOAD = b"x" * 4096
+
+
+def _stock(url):
+    # What the app did before the profile: default pool and pysqlite's default 5s busy timeout.
+    engine = create_engine(url, connect_args={"check_same_thread": False})
+    return engine, engine
+
+
+def run(label, engines, threads, uploads):
+    writer, reader = engines
+    Base.metadata.create_all(bind=writer)
+    factory = make_sessionmaker(writer, reader)
+    expiration = datetime.now(timezone.utc) + timedelta(days=1)
+
+    def upload_and_ack(_):
+        try:
+            with factory() as session:
+                service = EncryptedFileService(session)
+                rec = service.save_file(
+                    name="bench.bin", content=PAYLOAD, salt=b"s" * 16, key=b"k",
+                    max_downloads=1, expiration_date=expiration,
+                )
+                service.acknowledge_download(rec)
+            return True
+        except Exception:
+            return False
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=threads) as pool:
+        results = list(pool.map(upload_and_ack, range(uploads)))
+    elapsed = time.perf_counter() - started
+    failed = results.count(False)
+    ok = uploads - failed
+    print(f"{label:>8}: {ok / elapsed:8.1f} successful upload+ack/s  failed={failed}/{uploads}  ({elapsed:.2f}s)")
+    writer.dispose()
+    reader.dispose()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--threads", type=int, default=16)
+    parser.add_argument("--uploads", type=int, default=2000)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        run("stock", _stock(f"sqlite+pysqlite:///{tmp}/stock.db"), args.threads, args.uploads)
+        run("tuned", create_sqlite_engines(f"sqlite+pysqlite:///{tmp}/tuned.db"), args.threads, args.uploads)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,111 @@
+"""Compare the multipart upload path with the JSON text fast path.
+
+Usage:
+    python benchmarks/bench_text_fast_path.py --requests 50 --size 200
+
+Both paths run in-process against an in-memory SQLite database. For each path
+the script reports mean request latency for upload and download and the mean
+number of ciphertext bytes stored per secret. Both paths pay the same PBKDF2
+cost, which dominates wall time; the difference is in request parsing, the
+insert round trips and the stored size.
+"""
+import argparse
+import statistics
+import sys
+import time
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+
+from fastapi.testclient import TestClient
+from sqlalchemy import create_engine, func, select
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from app.database import Base, get_db  # noqa: E402
+from app.main import app  # noqa: E402
+from app.models.encrypted_file import EncryptedFile  # noqa: E402
+
+
+def _client():
+    engine = create_engine(
+        "sqlite+pysqlite:///:memory:",
+        connect_args={"check_same_thread": False},
+        poolclass=StaticPool,
+    )
+    Base.metadata.create_all(bind=engine)
+    factory = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+
+    def override_get_db():
+        db = factory()
+        try:
+            yield db
+        finally:
+            db.close()
+
+    app.dependency_overrides[get_db] = override_get_db
+    return TestClient(app), factory
+
+
+def _timed(fn):
+    started = time.perf_counter()
+    resp = fn()
+    resp.raise_for_status()
+    return time.perf_counter() - started, resp
+
+
+def run(label, upload, download, requests, text, expiration):
+    client, factory = _client()
+    up_times, down_times = [], []
+    for _ in range(requests):
+        elapsed, resp = _timed(lambda: upload(client, text, expiration))
+        up_times.append(elapsed)
+        token = resp.json()["download_token"]
+        elapsed, _ = _timed(lambda: download(client, token))
+        down_times.append(elapsed)
+    with factory() as session:
+        stored = session.execute(select(func.avg(func.length(EncryptedFile.content)))).scalar()
+    app.dependency_overrides.clear()
+    print(
+        f"{label:>9}: upload {statistics.mean(up_times) * 1000:7.1f} ms  "
+        f"download {statistics.mean(down_times) * 1000:7.1f} ms  stored {stored:.0f} B"
+    )
+
+
+def multipart_upload(client, text, expiration):
+    return client.post(
+        "/files/upload",
+        data={"text": text, "public_key": "bench-key", "max_downloads": "5", "expiration_date": expiration},
+    )
+
+
+def multipart_download(client, token):
+    return client.get(f"/files/download/{token}", params={"public_key": "bench-key"})
+
+
+def json_upload(client, text, expiration):
+    return client.post(
+        "/files/text",
+        json={"text": text, "public_key": "bench-key", "max_downloads": 5, "expiration_date": expiration},
+    )
+
+
+def json_download(client, token):
+    return client.get(f"/files/text/{token}", params={"public_key": "bench-key"})
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--requests", type=int, default=50)
+    parser.add_argument("--size", type=int, default=200, help="secret length in characters")
+    args = parser.parse_args()
+
+    text = "s" * args.size
+    expiration = (datetime.now(timezone.utc) + timedelta(days=1)).isoformat()
+    run("multipart", multipart_upload, multipart_download, args.requests, text, expiration)
+    run("json", json_upload, json_download, args.requests, text, expiration)
+
+
+if __name__ == "__main__":
+    main()
@@ -6,6 +6,8 @@ from sqlalchemy import pool
 from alembic import context
 from app.database import Base
 from app.models.encrypted_file import EncryptedFile
+from app.models.recipient_key import RecipientKey
+from app.models.upload_job import UploadJob
 
 # this is the Alembic Config object, which provides
 # access to the values within the .ini file in use.
@@ -0,0 +1,49 @@
+"""Add envelope encryption recipient keys
+
+Revision ID: 5e8b07c3f912
+Revises: d41f8a2c6e07
+Create Date: 2026-10-18 15:03:27.902615
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '5e8b07c3f912'
+down_revision: Union[str, Sequence[str], None] = 'd41f8a2c6e07'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('encrypted_files', sa.Column('is_envelope', sa.Boolean(), server_default=sa.false(), nullable=False))
+    op.create_table('recipient_keys',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('file_id', sa.Integer(), nullable=False),
+    sa.Column('download_token', sa.String(length=64), nullable=False),
+    sa.Column('salt', sa.LargeBinary(), nullable=False),
+    sa.Column('wrapped_key', sa.LargeBinary(), nullable=False),
+    sa.Column('kdf_iterations', sa.Integer(), nullable=False),
+    sa.Column('max_downloads', sa.Integer(), nullable=False),
+    sa.Column('expiration_date', sa.DateTime(timezone=True), nullable=False),
+    sa.Column('created_at', sa.DateTime(timezone=True), nullable=False),
+    sa.Column('download_count', sa.Integer(), nullable=False),
+    sa.ForeignKeyConstraint(['file_id'], ['encrypted_files.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index(op.f('ix_recipient_keys_download_token'), 'recipient_keys', ['download_token'], unique=True)
+    op.create_index(op.f('ix_recipient_keys_file_id'), 'recipient_keys', ['file_id'], unique=False)
+    op.create_index(op.f('ix_recipient_keys_id'), 'recipient_keys', ['id'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index(op.f('ix_recipient_keys_id'), table_name='recipient_keys')
+    op.drop_index(op.f('ix_recipient_keys_file_id'), table_name='recipient_keys')
+    op.drop_index(op.f('ix_recipient_keys_download_token'), table_name='recipient_keys')
+    op.drop_table('recipient_keys')
+    op.drop_column('encrypted_files', 'is_envelope')
@@ -0,0 +1,34 @@
+"""Add re-encryption columns to encrypted files
+
+Revision ID: 9c3e1d7a5b21
+Revises: 4a4bed19ba9c
+Create Date: 2026-10-18 09:12:41.538107
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '9c3e1d7a5b21'
+down_revision: Union[str, Sequence[str], None] = '4a4bed19ba9c'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('encrypted_files', sa.Column('format_version', sa.Integer(), server_default='1', nullable=False))
+    op.add_column('encrypted_files', sa.Column('kdf_iterations', sa.Integer(), server_default='1200000', nullable=False))
+    op.add_column('encrypted_files', sa.Column('storage', sa.String(length=16), server_default='db', nullable=False))
+    op.add_column('encrypted_files', sa.Column('needs_migration', sa.Boolean(), server_default=sa.false(), nullable=False))
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_column('encrypted_files', 'needs_migration')
+    op.drop_column('encrypted_files', 'storage')
+    op.drop_column('encrypted_files', 'kdf_iterations')
+    op.drop_column('encrypted_files', 'format_version')
@@ -0,0 +1,48 @@
+"""Add upload jobs for asynchronous uploads
+
+Revision ID: b7a2e94d0c38
+Revises: 5e8b07c3f912
+Create Date: 2026-10-18 17:26:51.640193
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'b7a2e94d0c38'
+down_revision: Union[str, Sequence[str], None] = '5e8b07c3f912'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table('upload_jobs',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('download_token', sa.String(length=64), nullable=False),
+    sa.Column('status', sa.String(length=16), nullable=False),
+    sa.Column('name', sa.String(length=255), nullable=False),
+    sa.Column('spool_path', sa.String(length=1024), nullable=False),
+    sa.Column('public_key', sa.String(), nullable=True),
+    sa.Column('max_downloads', sa.Integer(), nullable=False),
+    sa.Column('expiration_date', sa.DateTime(timezone=True), nullable=False),
+    sa.Column('error', sa.String(length=255), nullable=True),
+    sa.Column('created_at', sa.DateTime(timezone=True), nullable=False),
+    sa.Column('started_at', sa.DateTime(timezone=True), nullable=True),
+    sa.Column('finished_at', sa.DateTime(timezone=True), nullable=True),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index(op.f('ix_upload_jobs_download_token'), 'upload_jobs', ['download_token'], unique=True)
+    op.create_index(op.f('ix_upload_jobs_id'), 'upload_jobs', ['id'], unique=False)
+    op.create_index(op.f('ix_upload_jobs_status'), 'upload_jobs', ['status'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index(op.f('ix_upload_jobs_status'), table_name='upload_jobs')
+    op.drop_index(op.f('ix_upload_jobs_id'), table_name='upload_jobs')
+    op.drop_index(op.f('ix_upload_jobs_download_token'), table_name='upload_jobs')
+    op.drop_table('upload_jobs')
@@ -0,0 +1,30 @@
+"""Add content checksum and quarantine to encrypted files
+
+Revision ID: d41f8a2c6e07
+Revises: 9c3e1d7a5b21
+Create Date: 2026-10-18 11:40:02.117384
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'd41f8a2c6e07'
+down_revision: Union[str, Sequence[str], None] = '9c3e1d7a5b21'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('encrypted_files', sa.Column('content_sha256', sa.String(length=64), nullable=True))
+    op.add_column('encrypted_files', sa.Column('quarantined_at', sa.DateTime(timezone=True), nullable=True))
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_column('encrypted_files', 'quarantined_at')
+    op.drop_column('encrypted_files', 'content_sha256')
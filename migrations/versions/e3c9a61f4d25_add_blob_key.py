@@ -0,0 +1,30 @@
+"""Add blob_key so blob rewrites never replace a committed blob in place
+
+Revision ID: e3c9a61f4d25
+Revises: b7a2e94d0c38
+Create Date: 2026-10-18 19:02:37.518204
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'e3c9a61f4d25'
+down_revision: Union[str, Sequence[str], None] = 'b7a2e94d0c38'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('encrypted_files', sa.Column('blob_key', sa.String(length=96), nullable=True))
+    # Existing blobs were stored under the download token.
+    op.execute("UPDATE encrypted_files SET blob_key = download_token WHERE storage = 'fs'")
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_column('encrypted_files', 'blob_key')
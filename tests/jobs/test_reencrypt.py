@@ -0,0 +1,190 @@
+from datetime import datetime, timezone, timedelta
+import json
+from dataclasses import asdict
+
+from cryptography.fernet import Fernet
+from sqlalchemy.orm import sessionmaker
+
+from app.jobs import reencrypt
+from app.jobs.reencrypt import MigrationOptions, run_migration
+from app.models.encrypted_file import EncryptedFile
+from app.services.blob_store import LocalBlobStore
+from app.services.encrypted_file_service import EncryptedFileService
+from app.services.encryptor import Encryptor, KDF_ITERATIONS
+
+
+def _save(db_session, encryptor, plaintext=b"payload"):
+    service = EncryptedFileService(db_session)
+    rec = service.save_file(
+        name="f.txt",
+        content=encryptor.encrypt(plaintext),
+        salt=encryptor.get_salt(),
+        key=encryptor.get_key(),
+        max_downloads=3,
+        expiration_date=datetime.now(timezone.utc) + timedelta(days=1),
+    )
+    rec.kdf_iterations = encryptor.iterations
+    db_session.commit()
+    return rec
+
+
+def test_moves_content_between_stores(test_engine, db_session, tmp_path):
+    encryptor = Encryptor.from_key(Fernet.generate_key(), b"salt123456789012")
+    rec = _save(db_session, encryptor)
+    factory = sessionmaker(bind=test_engine)
+    store = LocalBlobStore(tmp_path)
+
+    stats = run_migration(
+        factory, MigrationOptions(target_storage="fs", blob_dir=str(tmp_path)), batch_size=2, workers=2
+    )
+    assert stats.errors == 0 and stats.rewritten == 1
+    db_session.refresh(rec)
+    assert rec.storage == "fs" and rec.content == b""
+    assert encryptor.decrypt(store.get(rec.blob_key)) == b"payload"
+    blob_key = rec.blob_key
+
+    run_migration(factory, MigrationOptions(target_storage="db", blob_dir=str(tmp_path)), workers=0)
+    db_session.refresh(rec)
+    assert rec.storage == "db" and rec.blob_key is None
+    assert encryptor.decrypt(rec.content) == b"payload"
+    assert not store.path_for(blob_key).exists()
+
+
+def test_format_rewrite_in_blob_store_switches_blob(test_engine, db_session, tmp_path):
+    encryptor = Encryptor.from_key(Fernet.generate_key(), b"salt123456789012")
+    rec = _save(db_session, encryptor)
+    factory = sessionmaker(bind=test_engine)
+    store = LocalBlobStore(tmp_path)
+    run_migration(factory, MigrationOptions(target_storage="fs", blob_dir=str(tmp_path)), workers=0)
+    db_session.refresh(rec)
+    old_key = rec.blob_key
+
+    run_migration(factory, MigrationOptions(target_format=2, target_storage="fs", blob_dir=str(tmp_path)), workers=0)
+    db_session.refresh(rec)
+    assert rec.format_version == 2 and rec.blob_key != old_key
+    assert not store.path_for(old_key).exists()
+    content = store.get(rec.blob_key)
+    assert rec.content_sha256 == EncryptedFileService.content_digest(content)
+    assert encryptor.decrypt(content, 2) == b"payload"
+
+
+def test_resumes_from_checkpoint(test_engine, db_session, tmp_path):
+    encryptor = Encryptor.from_key(Fernet.generate_key(), b"salt123456789012")
+    first = _save(db_session, encryptor)
+    second = _save(db_session, encryptor)
+    options = MigrationOptions(target_storage="fs", blob_dir=str(tmp_path / "blobs"))
+    checkpoint = tmp_path / "progress.json"
+    checkpoint.write_text(json.dumps({"options": asdict(options), "stats": {"last_id": first.id, "processed": 1}}))
+
+    stats = run_migration(sessionmaker(bind=test_engine), options, workers=0, checkpoint=str(checkpoint))
+    db_session.refresh(first)
+    db_session.refresh(second)
+    assert first.storage == "db"
+    assert second.storage == "fs"
+    assert stats.processed == 2 and stats.last_id >= second.id
+    assert not checkpoint.exists()
+
+
+def test_back_to_back_runs_share_checkpoint(test_engine, db_session, tmp_path):
+    encryptor = Encryptor.from_key(Fernet.generate_key(), b"salt123456789012")
+    rec = _save(db_session, encryptor)
+    factory = sessionmaker(bind=test_engine)
+    checkpoint = str(tmp_path / "progress.json")
+    blob_dir = str(tmp_path / "blobs")
+
+    run_migration(factory, MigrationOptions(target_storage="fs", blob_dir=blob_dir), workers=0, checkpoint=checkpoint)
+    db_session.refresh(rec)
+    assert rec.storage == "fs"
+
+    stats = run_migration(factory, MigrationOptions(target_storage="db", blob_dir=blob_dir), workers=0, checkpoint=checkpoint)
+    assert stats.rewritten == 1
+    db_session.refresh(rec)
+    assert rec.storage == "db"
+    assert encryptor.decrypt(rec.content) == b"payload"
+
+
+def test_checkpoint_for_other_options_is_discarded(test_engine, db_session, tmp_path):
+    encryptor = Encryptor.from_key(Fernet.generate_key(), b"salt123456789012")
+    rec = _save(db_session, encryptor)
+    checkpoint = tmp_path / "progress.json"
+    stale = MigrationOptions(target_storage="db", blob_dir=str(tmp_path))
+    checkpoint.write_text(json.dumps({"options": asdict(stale), "stats": {"last_id": rec.id, "processed": 1}}))
+
+    run_migration(
+        sessionmaker(bind=test_engine),
+        MigrationOptions(target_storage="fs", blob_dir=str(tmp_path)),
+        workers=0,
+        checkpoint=str(checkpoint),
+    )
+    db_session.refresh(rec)
+    assert rec.storage == "fs"
+
+
+def test_kdf_change_flags_row_for_lazy_migration(test_engine, db_session, client):
+    rec = _save(db_session, Encryptor("recipient-key", iterations=1_000))
+
+    stats = run_migration(sessionmaker(bind=test_engine), MigrationOptions(), workers=0)
+    assert stats.flagged == 1
+    db_session.refresh(rec)
+    assert rec.needs_migration is True
+
+    down = client.get(f"/files/download/{rec.download_token}", params={"public_key": "recipient-key"})
+    assert down.status_code == 200
+    assert down.content == b"payload"
+    db_session.refresh(rec)
+    assert rec.needs_migration is False
+    assert rec.kdf_iterations == KDF_ITERATIONS
+
+
+def test_default_run_never_downgrades_text_rows(test_engine, db_session, client, tmp_path):
+    future = (datetime.now(timezone.utc) + timedelta(days=1)).isoformat()
+    up = client.post(
+        "/files/text",
+        json={"text": "short secret", "public_key": "text-key", "max_downloads": 2, "expiration_date": future},
+    )
+    rec = db_session.query(EncryptedFile).filter_by(download_token=up.json()["download_token"]).one()
+    content = rec.content
+    factory = sessionmaker(bind=test_engine)
+
+    stats = run_migration(factory, MigrationOptions(), workers=0)
+    db_session.refresh(rec)
+    assert rec.format_version == 2 and rec.content == content
+    assert stats.rewritten == 0
+
+    run_migration(factory, MigrationOptions(target_storage="fs", blob_dir=str(tmp_path)), workers=0)
+    db_session.refresh(rec)
+    assert rec.storage == "fs" and rec.format_version == 2
+    assert LocalBlobStore(tmp_path).get(rec.blob_key) == content
+
+    run_migration(factory, MigrationOptions(blob_dir=str(tmp_path)), workers=0)
+    down = client.get(f"/files/text/{rec.download_token}", params={"public_key": "text-key"})
+    assert down.json()["text"] == "short secret"
+
+
+def test_row_migrated_by_download_during_batch_is_skipped(test_engine, db_session, tmp_path, monkeypatch):
+    rec = _save(db_session, Encryptor("recipient-key", iterations=1_000))
+    factory = sessionmaker(bind=test_engine)
+    run_migration(factory, MigrationOptions(), workers=0)
+    db_session.refresh(rec)
+    assert rec.needs_migration is True
+    original = reencrypt.transform_row
+
+    def download_before_commit(row, options):
+        result = original(row, options)
+        if row["id"] == rec.id:
+            with factory() as other:
+                EncryptedFileService(other).migrate_on_download(
+                    other.get(EncryptedFile, rec.id), "recipient-key", b"payload"
+                )
+        return result
+
+    monkeypatch.setattr(reencrypt, "transform_row", download_before_commit)
+    stats = run_migration(factory, MigrationOptions(target_storage="fs", blob_dir=str(tmp_path)), workers=0)
+    assert stats.skipped == 1
+    assert not any(p.is_file() for p in tmp_path.rglob("*"))
+
+    db_session.refresh(rec)
+    assert rec.storage == "db" and rec.needs_migration is False
+    assert rec.kdf_iterations == KDF_ITERATIONS
+    assert rec.content_sha256 == EncryptedFileService.content_digest(rec.content)
+    assert Encryptor("recipient-key", salt=rec.salt).decrypt(rec.content) == b"payload"
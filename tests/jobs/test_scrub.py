@@ -0,0 +1,116 @@
+from datetime import datetime, timezone, timedelta
+
+from sqlalchemy import event
+from sqlalchemy.orm import sessionmaker
+
+from app.jobs import scrub
+from app.jobs.scrub import RateLimiter, run_scrub
+from app.models.encrypted_file import EncryptedFile
+from app.services.blob_store import LocalBlobStore
+from app.services.encrypted_file_service import EncryptedFileService
+from app.services.encryptor import Encryptor
+
+
+def _save(db_session, content=b"ciphertext"):
+    return EncryptedFileService(db_session).save_file(
+        name="f.txt",
+        content=content,
+        salt=b"salt123456789012",
+        key=b"k",
+        max_downloads=3,
+        expiration_date=datetime.now(timezone.utc) + timedelta(days=1),
+    )
+
+
+def test_save_file_records_checksum(db_session):
+    rec = _save(db_session)
+    assert rec.content_sha256 == EncryptedFileService.content_digest(b"ciphertext")
+
+
+def test_scrub_quarantines_corrupted_rows(test_engine, db_session, client):
+    intact = _save(db_session)
+    corrupted = _save(db_session)
+    corrupted.content = b"bit-rotted"
+    db_session.commit()
+
+    stats = run_scrub(sessionmaker(bind=test_engine), workers=2)
+    assert stats.mismatched == [corrupted.id]
+
+    db_session.refresh(corrupted)
+    db_session.refresh(intact)
+    assert corrupted.quarantined_at is not None
+    assert intact.quarantined_at is None
+
+    resp = client.get(f"/files/download/{corrupted.download_token}", params={"public_key": "k"})
+    assert resp.status_code == 409
+    ack = client.post(f"/files/download/ack/{corrupted.download_token}")
+    assert ack.status_code == 409
+
+
+def test_scrub_report_only_does_not_quarantine(test_engine, db_session):
+    rec = _save(db_session)
+    rec.content = b"bit-rotted"
+    db_session.commit()
+
+    stats = run_scrub(sessionmaker(bind=test_engine), workers=1, quarantine=False)
+    assert stats.mismatched == [rec.id]
+    db_session.refresh(rec)
+    assert rec.quarantined_at is None
+
+
+def test_download_distinguishes_corruption_from_wrong_key(client, db_session):
+    rec = _save(db_session)
+    rec.content = b"bit-rotted"
+    db_session.commit()
+
+    resp = client.get(f"/files/download/{rec.download_token}", params={"public_key": "k"})
+    assert resp.status_code == 409
+    db_session.refresh(rec)
+    assert rec.quarantined_at is not None
+
+
+def test_concurrent_rewrite_is_not_quarantined(test_engine, db_session, tmp_path):
+    store = LocalBlobStore(tmp_path)
+    encryptor = Encryptor("recipient-key", iterations=1_000)
+    rec = _save(db_session, b"")
+    rec.salt, rec.key, rec.kdf_iterations = encryptor.get_salt(), encryptor.get_key(), 1_000
+    rec.storage, rec.blob_key = "fs", store.new_key(rec.download_token)
+    store.put(rec.blob_key, encryptor.encrypt(b"payload"))
+    rec.content_sha256 = EncryptedFileService.content_digest(store.get(rec.blob_key))
+    db_session.commit()
+    stale_sha, stale_key = rec.content_sha256, rec.blob_key
+
+    # Another session rewrites the blob and checksum while this one still holds the old values.
+    with sessionmaker(bind=test_engine)() as other:
+        EncryptedFileService(other, store).migrate_on_download(other.get(EncryptedFile, rec.id), "recipient-key", b"payload")
+
+    assert rec.blob_key == stale_key and rec.content_sha256 == stale_sha
+    content = EncryptedFileService(db_session, store).load_verified(rec)
+    assert content is not None
+    assert rec.quarantined_at is None and rec.blob_key != stale_key
+
+    stats = run_scrub(sessionmaker(bind=test_engine), blob_dir=str(tmp_path), workers=1)
+    assert stats.checked == 1 and stats.mismatched == []
+
+
+def test_scrub_rate_limits_before_fetching_content(test_engine, db_session, monkeypatch):
+    rec = _save(db_session, b"x" * 1000)
+    events = []
+
+    class RecordingLimiter(RateLimiter):
+        def acquire(self, amount):
+            events.append(("acquire", amount))
+
+    def record_fetch(conn, cursor, statement, parameters, context, executemany):
+        if statement.startswith("SELECT encrypted_files.content \nFROM"):
+            events.append(("fetch", None))
+
+    monkeypatch.setattr(scrub, "RateLimiter", RecordingLimiter)
+    event.listen(test_engine, "before_cursor_execute", record_fetch)
+    try:
+        stats = run_scrub(sessionmaker(bind=test_engine), workers=1)
+    finally:
+        event.remove(test_engine, "before_cursor_execute", record_fetch)
+
+    assert stats.checked == 1 and stats.mismatched == []
+    assert events == [("acquire", 1000), ("fetch", None)]
@@ -1,4 +1,5 @@
 from datetime import datetime, timezone, timedelta
+import time
 
 from app.models.encrypted_file import EncryptedFile
 
@@ -204,3 +205,107 @@ def test_ack_respects_expiration(client, db_session):
 
     ack = client.post(f"/files/download/ack/{expired_token}")
     assert ack.status_code == 410
+
+
+def test_text_fast_path_roundtrip(client, db_session):
+    future = (datetime.now(timezone.utc) + timedelta(days=1)).isoformat()
+    up = client.post(
+        "/files/text",
+        json={"text": "the vault code is 1234", "public_key": "text-key", "max_downloads": 2, "expiration_date": future},
+    )
+    assert up.status_code == 200
+    token = up.json()["download_token"]
+    assert len(token) == 64
+
+    rec = db_session.query(EncryptedFile).filter_by(download_token=token).first()
+    assert rec.name == "message.txt"
+    # nonce(12) + plaintext + GCM tag(16), stored inline without base64
+    assert rec.storage == "db"
+    assert len(rec.content) == len("the vault code is 1234") + 28
+
+    down = client.get(f"/files/text/{token}", params={"public_key": "text-key"})
+    assert down.status_code == 200
+    assert down.json() == {"name": "message.txt", "text": "the vault code is 1234"}
+
+    # Text uploads are also readable through the multipart download endpoint
+    raw = client.get(f"/files/download/{token}", params={"public_key": "text-key"})
+    assert raw.content == b"the vault code is 1234"
+
+    wrong = client.get(f"/files/text/{token}", params={"public_key": "wrong-key"})
+    assert wrong.status_code == 400
+
+
+def test_text_fast_path_rejects_oversized_text(client):
+    future = (datetime.now(timezone.utc) + timedelta(days=1)).isoformat()
+    resp = client.post(
+        "/files/text",
+        json={"text": "x" * 100_000, "public_key": "k", "max_downloads": 1, "expiration_date": future},
+    )
+    assert resp.status_code == 413
+
+
+def test_text_fast_path_requires_policy(client):
+    resp = client.post("/files/text", json={"text": "hi", "public_key": "k"})
+    assert resp.status_code == 400
+
+
+def test_async_upload_returns_202_until_processed(client, db_session, tmp_path, monkeypatch):
+    from app.models.upload_job import UploadJob
+    from app.services import upload_job_service
+    from app.services.upload_job_service import UploadJobService
+
+    monkeypatch.setattr(upload_job_service, "UPLOAD_SPOOL_DIR", str(tmp_path))
+    future = (datetime.now(timezone.utc) + timedelta(days=1)).isoformat()
+    files = {"file": ("big.bin", b"large payload", "application/octet-stream")}
+    data = {"public_key": "async-key", "max_downloads": "2", "expiration_date": future}
+
+    up = client.post("/files/upload/async", files=files, data=data)
+    assert up.status_code == 202
+    body = up.json()
+    token = body["download_token"]
+    assert body["status"] == "pending"
+    assert body["status_url"] == f"/files/upload/status/{token}"
+
+    # No worker pool is running under TestClient, so the job stays pending.
+    pending = client.get(f"/files/download/{token}", params={"public_key": "async-key"})
+    assert pending.status_code == 202
+    assert client.get(body["status_url"]).json()["status"] == "pending"
+    assert client.get("/files/upload/queue").json()["queue_depth"] >= 1
+
+    job = db_session.query(UploadJob).filter_by(download_token=token).first()
+    UploadJobService(db_session).process(job.id)
+
+    status = client.get(body["status_url"], params={"wait": 5}).json()
+    assert status == {"download_token": token, "status": "ready", "error": None}
+    down = client.get(f"/files/download/{token}", params={"public_key": "async-key"})
+    assert down.status_code == 200
+    assert down.content == b"large payload"
+    assert list(tmp_path.iterdir()) == []
+
+
+def test_async_upload_rejects_invalid_policy(client, tmp_path, monkeypatch):
+    from app.services import upload_job_service
+
+    monkeypatch.setattr(upload_job_service, "UPLOAD_SPOOL_DIR", str(tmp_path))
+    files = {"file": ("f.bin", b"payload", "application/octet-stream")}
+    resp = client.post(
+        "/files/upload/async", files=files, data={"public_key": "k", "policy_b64": "not-base64!!"}
+    )
+    assert resp.status_code == 400
+    assert resp.json()["detail"] == "Invalid encrypted policy"
+    assert list(tmp_path.iterdir()) == []
+
+
+def test_upload_status_long_poll_times_out_pending(client, tmp_path, monkeypatch):
+    from app.services import upload_job_service
+
+    monkeypatch.setattr(upload_job_service, "UPLOAD_SPOOL_DIR", str(tmp_path))
+    future = (datetime.now(timezone.utc) + timedelta(days=1)).isoformat()
+    files = {"file": ("f.bin", b"payload", "application/octet-stream")}
+    up = client.post("/files/upload/async", files=files, data={"public_key": "k", "max_downloads": "1", "expiration_date": future})
+
+    started = time.monotonic()
+    status = client.get(up.json()["status_url"], params={"wait": 0.6})
+    assert status.json()["status"] == "pending"
+    assert time.monotonic() - started >= 0.5
+    assert client.get("/files/upload/status/unknown").status_code == 404
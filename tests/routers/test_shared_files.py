@@ -0,0 +1,94 @@
+from datetime import datetime, timezone, timedelta
+
+from app.models.encrypted_file import EncryptedFile
+from app.models.recipient_key import RecipientKey
+
+
+def _share(client, recipients, max_downloads="2"):
+    future = (datetime.now(timezone.utc) + timedelta(days=1)).isoformat()
+    files = {"file": ("report.pdf", b"quarterly numbers", "application/pdf")}
+    data = {
+        "owner_key": "owner-key",
+        "recipient_keys": recipients,
+        "max_downloads": max_downloads,
+        "expiration_date": future,
+    }
+    resp = client.post("/files/shared", files=files, data=data)
+    assert resp.status_code == 200
+    return resp.json()
+
+
+def test_one_ciphertext_serves_many_recipients(client, db_session):
+    body = _share(client, ["alice-key", "bob-key"])
+    alice, bob = body["download_tokens"]
+
+    for token, key in ((alice, "alice-key"), (bob, "bob-key")):
+        down = client.get(f"/files/shared/download/{token}", params={"public_key": key})
+        assert down.status_code == 200
+        assert down.content == b"quarterly numbers"
+        assert down.headers["content-disposition"].startswith('attachment; filename="report.pdf"')
+
+    rec = db_session.query(EncryptedFile).filter_by(download_token=body["owner_token"]).first()
+    assert rec.is_envelope is True
+    assert db_session.query(RecipientKey).filter_by(file_id=rec.id).count() == 2
+
+    # Recipient keys do not open each other's tokens, and the owner token is not a download link.
+    wrong = client.get(f"/files/shared/download/{alice}", params={"public_key": "bob-key"})
+    assert wrong.status_code == 400
+    owner = client.get(f"/files/download/{body['owner_token']}", params={"public_key": "owner-key"})
+    assert owner.status_code == 404
+
+
+def test_add_and_revoke_recipient(client, db_session):
+    body = _share(client, ["alice-key"])
+    owner_token = body["owner_token"]
+    rec = db_session.query(EncryptedFile).filter_by(download_token=owner_token).first()
+    content_before = rec.content
+
+    denied = client.post(
+        f"/files/shared/{owner_token}/recipients", data={"owner_key": "nope", "public_key": "carol-key"}
+    )
+    assert denied.status_code == 403
+
+    added = client.post(
+        f"/files/shared/{owner_token}/recipients", data={"owner_key": "owner-key", "public_key": "carol-key"}
+    )
+    assert added.status_code == 200
+    carol = added.json()["download_token"]
+    down = client.get(f"/files/shared/download/{carol}", params={"public_key": "carol-key"})
+    assert down.content == b"quarterly numbers"
+
+    revoked = client.delete(
+        f"/files/shared/{owner_token}/recipients/{carol}", params={"owner_key": "owner-key"}
+    )
+    assert revoked.status_code == 200
+    gone = client.get(f"/files/shared/download/{carol}", params={"public_key": "carol-key"})
+    assert gone.status_code == 404
+
+    db_session.refresh(rec)
+    assert rec.content == content_before
+
+
+def test_recipients_have_independent_counters(client):
+    alice, bob = _share(client, ["alice-key", "bob-key"], max_downloads="1")["download_tokens"]
+
+    assert client.post(f"/files/shared/download/ack/{alice}").status_code == 200
+    assert client.post(f"/files/shared/download/ack/{alice}").status_code == 429
+    assert client.get(f"/files/shared/download/{alice}", params={"public_key": "alice-key"}).status_code == 429
+
+    assert client.post(f"/files/shared/download/ack/{bob}").status_code == 200
+
+
+def test_quarantined_shared_file_rejects_download_and_ack(client, db_session):
+    body = _share(client, ["alice-key"])
+    (alice,) = body["download_tokens"]
+    rec = db_session.query(EncryptedFile).filter_by(download_token=body["owner_token"]).first()
+    rec.quarantined_at = datetime.now(timezone.utc)
+    db_session.commit()
+
+    down = client.get(f"/files/shared/download/{alice}", params={"public_key": "alice-key"})
+    assert down.status_code == 409
+    ack = client.post(f"/files/shared/download/ack/{alice}")
+    assert ack.status_code == 409
+    db_session.expire_all()
+    assert db_session.query(RecipientKey).filter_by(download_token=alice).one().download_count == 0
@@ -3,6 +3,8 @@ import hashlib
 
 from app.services.encrypted_file_service import EncryptedFileService
 from app.models.encrypted_file import EncryptedFile
+from app.services.blob_store import LocalBlobStore
+from app.services.encryptor import Encryptor
 
 
 def test_save_file_persists_record(db_session):
@@ -64,3 +66,29 @@ def test_save_file_retries_on_token_collision(db_session, monkeypatch):
 
     expected_digest = hashlib.sha256("bbb".encode()).hexdigest()
     assert rec.download_token == expected_digest
+
+
+def test_migrate_on_download_switches_blob_in_one_commit(db_session, tmp_path):
+    store = LocalBlobStore(tmp_path)
+    service = EncryptedFileService(db_session, store)
+    old = Encryptor("recipient-key", iterations=1_000)
+    rec = service.save_file(
+        name="f.txt",
+        content=b"",
+        salt=old.get_salt(),
+        key=old.get_key(),
+        max_downloads=3,
+        expiration_date=datetime.now(timezone.utc) + timedelta(days=1),
+    )
+    rec.storage, rec.blob_key = "fs", store.new_key(rec.download_token)
+    store.put(rec.blob_key, old.encrypt(b"payload"))
+    db_session.commit()
+    old_key = rec.blob_key
+
+    service.migrate_on_download(rec, "recipient-key", b"payload")
+    db_session.refresh(rec)
+    assert rec.blob_key != old_key
+    assert not store.path_for(old_key).exists()
+    content = service.load_content(rec)
+    assert service.verify_content(rec, content)
+    assert Encryptor.from_key(rec.key, rec.salt).decrypt(content) == b"payload"
@@ -0,0 +1,51 @@
+from datetime import datetime, timezone, timedelta
+
+import pytest
+
+from app.models.encrypted_file import EncryptedFile
+from app.models.recipient_key import RecipientKey
+from app.services.encrypted_file_service import EncryptedFileService
+from app.services.envelope_service import EnvelopeService
+
+
+def test_recipient_expiry_is_capped_and_purged_with_file(db_session):
+    service = EnvelopeService(db_session)
+    file_expiry = datetime.now(timezone.utc) + timedelta(hours=1)
+    rec, dek, _ = service.create(
+        name="f.txt", plaintext=b"shared", owner_key="owner", max_downloads=1, expiration_date=file_expiry
+    )
+    assert service.unwrap_for_owner(rec, "owner") == dek
+
+    recipient = service.add_recipient(
+        rec, dek, public_key="alice", max_downloads=1, expiration_date=file_expiry + timedelta(days=30)
+    )
+    stored_expiry = recipient.expiration_date.replace(tzinfo=recipient.expiration_date.tzinfo or timezone.utc)
+    assert stored_expiry == file_expiry
+    assert service.decrypt_for_recipient(recipient, rec.content, rec.format_version, "alice") == b"shared"
+
+    rec_id, recipient_id = rec.id, recipient.id
+    purged = EncryptedFileService(db_session).purge_expired(file_expiry + timedelta(seconds=1))
+    assert purged >= 2
+    assert db_session.get(EncryptedFile, rec_id) is None
+    assert db_session.get(RecipientKey, recipient_id) is None
+
+
+def test_create_stores_file_and_recipients_in_one_transaction(db_session, monkeypatch):
+    service = EnvelopeService(db_session)
+    expiry = datetime.now(timezone.utc) + timedelta(hours=1)
+    rec, dek, recipients = service.create(
+        name="f.txt", plaintext=b"shared", owner_key="owner", max_downloads=1,
+        expiration_date=expiry, recipient_keys=["alice", "bob"],
+    )
+    assert [r.file_id for r in recipients] == [rec.id, rec.id]
+    assert service.decrypt_for_recipient(recipients[1], rec.content, rec.format_version, "bob") == b"shared"
+
+    # Recipients colliding with each other on every attempt must not leave the file row behind.
+    files_before = db_session.query(EncryptedFile).count()
+    monkeypatch.setattr(service.files, "new_token_b62", lambda: "same")
+    with pytest.raises(RuntimeError):
+        service.create(
+            name="f.txt", plaintext=b"shared", owner_key="owner", max_downloads=1,
+            expiration_date=expiry, recipient_keys=["alice", "bob"],
+        )
+    assert db_session.query(EncryptedFile).count() == files_before
@@ -0,0 +1,121 @@
+from datetime import datetime, timezone, timedelta
+import io
+import os
+import stat
+import time
+
+from sqlalchemy.orm import sessionmaker
+
+from app.models.encrypted_file import EncryptedFile
+from app.models.upload_job import UploadJob
+from app.services.encrypted_file_service import EncryptedFileService
+from app.services.upload_job_service import UploadJobService, UploadPipeline
+
+
+def _enqueue(db_session, spool_dir, payload=b"spooled bytes"):
+    service = UploadJobService(db_session, spool_dir)
+    return service.enqueue(
+        name="f.bin",
+        spool_path=service.spool(io.BytesIO(payload)),
+        public_key="job-key",
+        max_downloads=1,
+        expiration_date=datetime.now(timezone.utc) + timedelta(days=1),
+    )
+
+
+def test_failed_job_records_error_and_clears_key(db_session, tmp_path):
+    job = _enqueue(db_session, tmp_path)
+    (tmp_path / job.spool_path.rsplit("/", 1)[-1]).unlink()
+
+    processed = UploadJobService(db_session, tmp_path).process(job.id)
+    assert processed.status == "failed"
+    assert processed.error.startswith("FileNotFoundError")
+    assert processed.public_key is None
+
+    # Already finished jobs are not claimed again.
+    assert UploadJobService(db_session, tmp_path).process(job.id) is None
+
+
+def test_pipeline_resumes_interrupted_jobs(test_engine, db_session, tmp_path):
+    job = _enqueue(db_session, tmp_path)
+    job.status = "processing"  # simulate a crash mid-job
+    db_session.commit()
+
+    pipeline = UploadPipeline(sessionmaker(bind=test_engine), workers=1)
+    pipeline.start()
+    try:
+        deadline = time.monotonic() + 30
+        while time.monotonic() < deadline:
+            db_session.expire_all()
+            if db_session.get(UploadJob, job.id).status == "ready":
+                break
+            time.sleep(0.1)
+    finally:
+        pipeline.shutdown()
+
+    assert db_session.get(UploadJob, job.id).status == "ready"
+    rec = db_session.query(EncryptedFile).filter_by(download_token=job.download_token).first()
+    assert rec is not None and rec.name == "f.bin"
+
+    stats = UploadJobService(db_session).queue_stats()
+    assert stats["recent_mean_latency_seconds"] > 0
+
+
+def test_recover_leaves_jobs_with_live_leases_alone(db_session, tmp_path):
+    live = _enqueue(db_session, tmp_path)
+    stale = _enqueue(db_session, tmp_path)
+    live.status, live.started_at = "processing", datetime.now(timezone.utc)
+    stale.status, stale.started_at = "processing", datetime.now(timezone.utc) - timedelta(hours=1)
+    db_session.commit()
+
+    pending = UploadJobService(db_session, tmp_path).recover(lease_seconds=600)
+    assert stale.id in pending and live.id not in pending
+    db_session.refresh(live)
+    assert live.status == "processing"
+
+    for job in (live, stale):
+        db_session.delete(job)
+    db_session.commit()
+
+
+def test_job_stored_by_another_worker_is_marked_ready(db_session, tmp_path, monkeypatch):
+    job = _enqueue(db_session, tmp_path)
+    original = EncryptedFileService.save_file
+
+    def save_after_sibling(self, **kwargs):
+        original(self, **kwargs)  # the worker that held the expired lease finishes first
+        return original(self, **kwargs)
+
+    monkeypatch.setattr(EncryptedFileService, "save_file", save_after_sibling)
+    processed = UploadJobService(db_session, tmp_path).process(job.id)
+    assert processed.status == "ready" and processed.error is None
+    assert db_session.query(EncryptedFile).filter_by(download_token=job.download_token).count() == 1
+
+
+def test_pipeline_takes_over_lease_expiring_while_running(test_engine, db_session, tmp_path):
+    job = _enqueue(db_session, tmp_path)
+    job.status, job.started_at = "processing", datetime.now(timezone.utc)  # killed moments ago
+    db_session.commit()
+
+    pipeline = UploadPipeline(sessionmaker(bind=test_engine), workers=1, lease_seconds=1, recover_interval=0.2)
+    pipeline.start()
+    try:
+        db_session.expire_all()
+        assert db_session.get(UploadJob, job.id).status == "processing"
+        deadline = time.monotonic() + 30
+        while time.monotonic() < deadline:
+            db_session.expire_all()
+            if db_session.get(UploadJob, job.id).status == "ready":
+                break
+            time.sleep(0.1)
+    finally:
+        pipeline.shutdown()
+
+    assert db_session.get(UploadJob, job.id).status == "ready"
+
+
+def test_spool_is_private_to_the_owner(tmp_path):
+    spool_dir = tmp_path / "spool"
+    path = UploadJobService(None, spool_dir).spool(io.BytesIO(b"plaintext"))
+    assert stat.S_IMODE(os.stat(spool_dir).st_mode) == 0o700
+    assert stat.S_IMODE(os.stat(path).st_mode) == 0o600